@@ -0,0 +1,268 @@
+#Benchmarks of the main functions at several data scales, on synthetic data from benchmarks/synthetic.py
+#Run from the repository root:
+#    python -m benchmarks.run --out benchmark_results.json
+#    python -m benchmarks.run --baseline benchmark_results.json   (flags regressions against an earlier run)
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+import requests
+
+from benchmarks import synthetic
+from week2.nytimes import CountyIndex, daily_cases
+from week2.project import fit_rnaught, sir, sir_batch, subset_county
+from week4.class_wrappers import ClassifierWrapper
+from week8.get_website import ResponseCache, demographic_by_zip, extract_all_features, merge_dfs
+
+
+#data sizes of every benchmark, quick is a subset for a fast check
+scales = {
+    'sir': [100, 1000, 10000],                #days simulated
+    'sir_batch': [10, 100, 1000],             #counties simulated at once for 365 days
+    'fit_rnaught': [30, 90, 365],             #days of cases fitted
+    'subset_county': [100, 1000, 3000],       #counties of 365 days, lookups by mask and by CountyIndex
+    'extract_all_features': [10, 50, 200],    #pages served from a warm ResponseCache
+    'demographic_by_zip': [1000, 10000, 40000],  #zips in the crosswalk, cold and warm cache
+    'merge_dfs': [100, 1000, 10000],          #universities with five results each
+    'ClassifierWrapper': [1000, 10000, 100000]   #wines trained and scored
+}
+quick_scales = {name: sizes[:2] for name, sizes in scales.items()}
+
+
+def measure(func, repeat: int = 5, budget: float = 10.0):
+    """Time a function several times
+
+    Stops early once the budget is spent, but always runs it at least twice.
+
+    Args:
+        func (callable): function without arguments
+        repeat (int, optional): number of runs. Defaults to 5.
+        budget (float, optional): seconds to spend at most. Defaults to 10.0.
+
+    Returns:
+        dict: best, median and all run times in seconds
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat and (len(times) < 2 or time.perf_counter() - start < budget):
+        tic = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - tic)
+    return {'best_seconds': min(times), 'median_seconds': float(np.median(times)), 'runs': times}
+
+
+def bench_sir(size: int, workdir: str):
+    return {'sir': lambda: sir(1_000_000 - 10, 10, 0, 2.5, 7, size)}, size
+
+
+def bench_sir_batch(size: int, workdir: str):
+    rng = np.random.default_rng(0)
+    r_naught = rng.uniform(1.2, 3.0, size)
+    return {'sir_batch': lambda: sir_batch(1_000_000 - 10, 10, 0, r_naught, 7, 365)}, size
+
+
+def bench_fit_rnaught(size: int, workdir: str):
+    cases = daily_cases(synthetic.nytimes_counties(1, size, seed=1))['cases']
+    return {
+        backend: (lambda backend=backend: fit_rnaught(cases, population=1_000_000, backend=backend))
+        for backend in ['discrete', 'jacobian', 'ode']
+    }, size
+
+
+def bench_subset_county(size: int, workdir: str):
+    df = daily_cases(synthetic.nytimes_counties(size, 365))
+    index = CountyIndex(df)
+    county, state = df['county'].iloc[len(df)//2], df['state'].iloc[len(df)//2]
+    return {
+        'mask': lambda: subset_county(df, county, state, '2020-06-01'),
+        'index': lambda: subset_county(df, county, state, '2020-06-01', index=index),
+        'index_build': lambda: CountyIndex(df)
+    }, len(df)
+
+
+def _cached_pages(pages: dict, directory: str) -> ResponseCache:
+    """Put pages in a ResponseCache so extract_all_features can run without a network
+
+    Args:
+        pages (dict(str,str)): html keyed by url
+        directory (str): directory of the cache
+
+    Returns:
+        ResponseCache: the cache holding every page
+    """
+    cache = ResponseCache(directory, ttl=float('inf'))
+    for url, html in pages.items():
+        website = requests.Response()
+        website._content = html.encode('utf-8')
+        website.encoding = 'utf-8'
+        website.status_code = 200
+        cache._store(url, website)
+    return cache
+
+
+def bench_extract_all_features(size: int, workdir: str):
+    pages = synthetic.html_pages(size)
+    cache = _cached_pages(pages, os.path.join(workdir, 'pages_%d' % size))
+    return {
+        'soup': lambda: [extract_all_features(url, cache=cache) for url in pages],
+        'fast': lambda: [extract_all_features(url, cache=cache, fast=True) for url in pages]
+    }, size
+
+
+def bench_demographic_by_zip(size: int, workdir: str):
+    directory = os.path.join(workdir, 'demographics_%d' % size)
+    os.makedirs(directory, exist_ok=True)
+    zip_path, demo_path = synthetic.write_demographics(directory, size)
+    cache_path = os.path.join(directory, 'demographics_by_zip.feather')
+
+    def cold():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        return demographic_by_zip(zip_path, demo_path, cache_path)
+
+    return {'cold': cold, 'warm': lambda: demographic_by_zip(zip_path, demo_path, cache_path)}, size
+
+
+def bench_merge_dfs(size: int, workdir: str):
+    directory = os.path.join(workdir, 'merge_%d' % size)
+    os.makedirs(directory, exist_ok=True)
+    zip_path, demo_path = synthetic.write_demographics(directory, 20000)
+    demo = demographic_by_zip(zip_path, demo_path)
+    universities = synthetic.scraped_universities(size, synthetic.zip_crosswalk(20000))
+    return {'merge_dfs': lambda: merge_dfs(demo, universities)}, len(universities)
+
+
+def bench_classifier_wrapper(size: int, workdir: str):
+    features, labels = synthetic.wine_features(size)
+    model = ClassifierWrapper()
+    model.train(features, labels, tree_method='hist', n_estimators=100)
+    path = os.path.join(workdir, 'wine_%d.xgb' % size)
+    model.save(path)
+
+    def train():
+        ClassifierWrapper().train(features, labels, tree_method='hist', n_estimators=100)
+
+    return {
+        'train': train,
+        'apply': lambda: model.apply(features),
+        'apply_iter': lambda: [chunk.copy() for chunk in model.apply_iter([features], chunk_size=8192)],
+        'assess': lambda: model.assess(features, labels, ['percent_correct', 'confusion_matrix']),
+        'load': lambda: ClassifierWrapper.from_file(path, use_cache=False)
+    }, size
+
+
+benchmarks = {
+    'sir': bench_sir,
+    'sir_batch': bench_sir_batch,
+    'fit_rnaught': bench_fit_rnaught,
+    'subset_county': bench_subset_county,
+    'extract_all_features': bench_extract_all_features,
+    'demographic_by_zip': bench_demographic_by_zip,
+    'merge_dfs': bench_merge_dfs,
+    'ClassifierWrapper': bench_classifier_wrapper
+}
+
+
+def scaling_exponent(sizes, seconds):
+    """Slope of log time against log size, 1 is linear, 2 quadratic
+
+    Args:
+        sizes (list[int]): data sizes
+        seconds (list[float]): time at each size
+
+    Returns:
+        float: the fitted exponent, None with fewer than two sizes
+    """
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(np.maximum(seconds, 1e-9)), 1)[0])
+
+
+def run(names: list = None, quick: bool = False, repeat: int = 5):
+    """Run benchmarks at every scale
+
+    Args:
+        names (list, optional): benchmarks to run. Defaults to all of them.
+        quick (bool, optional): only the smaller scales. Defaults to False.
+        repeat (int, optional): runs per measurement. Defaults to 5.
+
+    Returns:
+        dict: machine description, one result per benchmark, case and size, and the scaling curve of every case
+    """
+    names = list(benchmarks) if names is None else names
+    sizes_by_name = quick_scales if quick else scales
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            for size in sizes_by_name[name]:
+                cases, rows = benchmarks[name](size, workdir)
+                for case, func in cases.items():
+                    timing = measure(func, repeat)
+                    timing.update({'benchmark': name, 'case': case, 'size': size, 'rows': rows, 'rows_per_sec': rows/timing['best_seconds']})
+                    results.append(timing)
+                    print('%-22s %-12s %8d  %10.5f s' % (name, case, size, timing['best_seconds']))
+
+    curves = {}
+    for result in results:
+        curve = curves.setdefault('%s/%s' % (result['benchmark'], result['case']), {'sizes': [], 'best_seconds': []})
+        curve['sizes'].append(result['size'])
+        curve['best_seconds'].append(result['best_seconds'])
+    for curve in curves.values():
+        curve['exponent'] = scaling_exponent(curve['sizes'], curve['best_seconds'])
+
+    machine = {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'machine': machine, 'results': results, 'curves': curves}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 1.25):
+    """Find measurements that got slower than an earlier run
+
+    Args:
+        current (dict): output of run
+        baseline (dict): output of an earlier run
+        tolerance (float, optional): allowed ratio of best times before a result counts as a regression. Defaults to 1.25.
+
+    Returns:
+        list[dict]: benchmark, case, size, both times and their ratio for every regression
+    """
+    earlier = {(result['benchmark'], result['case'], result['size']): result['best_seconds'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['benchmark'], result['case'], result['size'])
+        if key in earlier and result['best_seconds'] > tolerance*earlier[key]:
+            regressions.append({
+                'benchmark': key[0], 'case': key[1], 'size': key[2],
+                'baseline_seconds': earlier[key], 'seconds': result['best_seconds'],
+                'ratio': result['best_seconds']/earlier[key]
+            })
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the class code on synthetic data')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default: %s' % ', '.join(benchmarks))
+    parser.add_argument('--quick', action='store_true', help='only the smaller scales')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    parser.add_argument('--out', default='benchmark_results.json', help='where to write the results')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown ratio that counts as a regression')
+    args = parser.parse_args()
+
+    current = run(args.names or None, args.quick, args.repeat)
+    with open(args.out, 'w') as fo:
+        json.dump(current, fo, indent=2)
+
+    for key, curve in current['curves'].items():
+        if curve['exponent'] is not None:
+            print('%-35s scales as size^%.2f' % (key, curve['exponent']))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as fo:
+            regressions = compare(current, json.load(fo), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION %(benchmark)s/%(case)s at %(size)d: %(baseline_seconds).5f s -> %(seconds).5f s (x%(ratio).2f)' % regression)
+        if regressions:
+            raise SystemExit(1)
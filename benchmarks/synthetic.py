@@ -0,0 +1,181 @@
+#Deterministic synthetic stand ins for the data files the scripts read
+#Every generator takes a seed, the same arguments always give the same data.
+import os
+import numpy as np
+import pandas as pd
+
+from week2.nytimes import nytimes_dtypes
+from week2.project import sir_batch
+from week8.get_website import demo_col_names, phrase_features, us_states
+
+
+def nytimes_counties(n_counties: int, n_days: int, seed: int = 0) -> pd.DataFrame:
+    """NYTimes style cumulative cases, one SIR epidemic per county
+
+    Args:
+        n_counties (int): number of counties
+        n_days (int): number of days of every county
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: cumulative NYTimes data sorted by date, in the dtypes load_us_counties returns
+    """
+    rng = np.random.default_rng(seed)
+    populations = rng.integers(5_000, 2_000_000, n_counties)
+    infected = rng.integers(1, 50, n_counties)
+    trajectories = sir_batch(populations - infected, infected, 0, rng.uniform(1.2, 3.0, n_counties), rng.uniform(5, 14, n_counties), n_days - 1)
+    recovered_and_infected = trajectories[:, :, 1] + trajectories[:, :, 2]
+    cases = np.maximum.accumulate(np.round(recovered_and_infected*rng.uniform(0.05, 0.3, (n_counties, 1))), axis=1).astype(np.int32)
+
+    states = [state.lower() for state in us_states.values()]
+    df = pd.DataFrame({
+        'date': np.tile(pd.date_range('2020-03-01', periods=n_days), n_counties),
+        'county': np.repeat(['county %d' % n for n in range(n_counties)], n_days),
+        'state': np.repeat([states[n % len(states)] for n in range(n_counties)], n_days),
+        'fips': np.repeat(1001 + np.arange(n_counties), n_days),
+        'cases': cases.ravel(),
+        'deaths': (cases.ravel()*0.01).astype(np.int32)
+    })
+    return df.sort_values(['date', 'fips'], kind='stable').reset_index(drop=True).astype(nytimes_dtypes)
+
+
+def write_nytimes_csv(path: str, n_counties: int, n_days: int, seed: int = 0) -> str:
+    """Write nytimes_counties as a csv shaped like us_counties.csv
+
+    Returns:
+        str: the path written
+    """
+    df = nytimes_counties(n_counties, n_days, seed)
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    df.to_csv(path, index=False)
+    return path
+
+
+def zip_crosswalk(n_zips: int, seed: int = 0) -> pd.DataFrame:
+    """Zip/ZCTA crosswalk with the columns demographic_by_zip reads
+
+    About one zip in twenty has no ZCTA, like PO boxes in the real file.
+
+    Args:
+        n_zips (int): number of zip codes
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: ZIP_CODE, PO_NAME, STATE and ZCTA
+    """
+    rng = np.random.default_rng(seed)
+    zips = np.sort(rng.choice(np.arange(1001, 99950), n_zips, replace=False))
+    zctas = np.where(rng.random(n_zips) < 0.05, 'No ZCTA', zips.astype(str))
+    return pd.DataFrame({
+        'ZIP_CODE': zips,
+        'PO_NAME': ['town %d' % n for n in rng.integers(0, max(n_zips//4, 1), n_zips)],
+        'STATE': rng.choice([state.upper() for state in us_states], n_zips),
+        'ZCTA': zctas
+    })
+
+
+def census_demographics(crosswalk: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Census DP05 style demographics for the ZCTAs of a crosswalk
+
+    The second row holds the column labels, as in the census download.
+
+    Args:
+        crosswalk (pd.DataFrame): output of zip_crosswalk
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: the columns of demo_col_names
+    """
+    rng = np.random.default_rng(seed)
+    zctas = crosswalk.loc[crosswalk['ZCTA'] != 'No ZCTA', 'ZCTA'].astype(int).unique()
+    demo = {'NAME': ['ZCTA5 %05d' % zcta for zcta in zctas]}
+    for column, name in demo_col_names.items():
+        if name == 'pop_total':
+            demo[column] = rng.integers(0, 60_000, len(zctas))
+        elif column != 'NAME':
+            demo[column] = rng.uniform(0, 20, len(zctas)).round(1)
+    demo = pd.DataFrame(demo)
+    labels = pd.DataFrame([{column: 'label' for column in demo.columns}])
+    return pd.concat([labels, demo], ignore_index=True)
+
+
+def write_demographics(directory: str, n_zips: int, seed: int = 0):
+    """Write a crosswalk and demographics csv pair for demographic_by_zip
+
+    Returns:
+        str, str: paths of the crosswalk and the demographics
+    """
+    crosswalk = zip_crosswalk(n_zips, seed)
+    zip_path = os.path.join(directory, 'zipzcta_crosswalk.csv')
+    demo_path = os.path.join(directory, 'demo.csv')
+    crosswalk.to_csv(zip_path, index=False)
+    census_demographics(crosswalk, seed).to_csv(demo_path, index=False)
+    return zip_path, demo_path
+
+
+def scraped_universities(n_universities: int, crosswalk: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Scrape results like loop_through_universities returns, five per university
+
+    Args:
+        n_universities (int): number of universities
+        crosswalk (pd.DataFrame): output of zip_crosswalk, zips are drawn from it
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: university, search_index, zip (mostly missing) and count_* columns
+    """
+    rng = np.random.default_rng(seed)
+    n = 5*n_universities
+    zips = rng.choice(crosswalk['ZIP_CODE'].to_numpy(), n).astype(float)
+    zips[rng.random(n) < 0.6] = np.nan
+    df = pd.DataFrame({
+        'university': np.repeat(['university %d' % k for k in range(n_universities)], 5),
+        'search_index': np.tile(np.arange(5), n_universities),
+        'zip': zips
+    })
+    for feature in phrase_features:
+        df[feature] = rng.poisson(0.3, n)
+    return df
+
+
+def wine_features(n_rows: int, seed: int = 0):
+    """Features and labels shaped like the white wine quality data
+
+    Args:
+        n_rows (int): number of wines
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray, np.ndarray: 11 features per row and a boolean 'good' label
+    """
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(n_rows, 11))
+    score = features[:, 0] - 0.5*features[:, 3] + features[:, 5]*features[:, 7] + rng.normal(scale=0.8, size=n_rows)
+    return features, score > 0
+
+
+def html_pages(n_pages: int, paragraphs: int = 40, seed: int = 0) -> dict:
+    """University diversity pages with navigation, scripts and an address
+
+    Args:
+        n_pages (int): number of pages
+        paragraphs (int, optional): paragraphs of body text per page. Defaults to 40.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        dict(str,str): html of every page keyed by url
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(['students', 'our', 'community', 'welcomes', 'and', 'the', 'of', 'diversity', 'inclusion', 'campus', 'support'] + list(phrase_features.values()))
+    states = list(us_states)
+    pages = {}
+    for n in range(n_pages):
+        body = ''.join('<p>%s <b>%s</b> %s.</p>\n' % tuple(' '.join(rng.choice(words, rng.integers(3, 25))) for _ in range(3)) for _ in range(paragraphs))
+        pages['https://www.university%d.edu/%s' % (n, '/'.join(['about', 'diversity'][:n % 3]))] = (
+            '<!DOCTYPE html><html><head><title>University %d</title><style>p {margin: 0}</style>'
+            '<script>var tracking = "asian";</script></head><body>'
+            '<nav><a href="/">Home</a> <a href="/admissions">Admissions</a></nav>\n%s'
+            '<footer>%d College Ave, Town, %s %05d-%04d | Phone 412-%03d-%04d</footer></body></html>'
+            % (n, body, rng.integers(1, 9999), states[n % len(states)], rng.integers(1001, 99950), rng.integers(0, 9999), rng.integers(200, 999), rng.integers(0, 9999))
+        )
+    return pages
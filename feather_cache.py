@@ -0,0 +1,83 @@
+#Columnar caches shared by the loaders of the analysis scripts
+#A cache is an uncompressed feather file, so it can be memory mapped, with a stamp
+#describing its inputs stored in the schema metadata to tell when it is stale.
+import os
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+
+
+def file_stamp(path: str, prefix: str = 'source') -> dict:
+    """Describe an input file so a stale cache can be detected
+
+    Args:
+        path (str): location of the input
+        prefix (str, optional): start of the stamp's keys, to tell several inputs apart. Defaults to 'source'.
+
+    Returns:
+        dict: mtime and size of the file as strings
+    """
+    stat = os.stat(path)
+    return {prefix + '_mtime_ns': str(stat.st_mtime_ns), prefix + '_size': str(stat.st_size)}
+
+
+def read_cache(cache_path: str):
+    """Memory map a cache
+
+    A cache that cannot be read, e.g. one cut short by a crash before the writes
+    went through a temp file, is treated like a missing one so it gets rebuilt.
+
+    Args:
+        cache_path (str): location of the feather cache
+
+    Returns:
+        pa.Table or None: the cached table, None if the file is missing or unreadable
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        return pyarrow.feather.read_table(cache_path, memory_map=True)
+    except (pa.ArrowInvalid, OSError):
+        return None
+
+
+def cache_stamp(table) -> dict:
+    """The stamp stored in a cache
+
+    Args:
+        table (pa.Table or None): table from read_cache
+
+    Returns:
+        dict: the stored stamp, empty if there is no table
+    """
+    if table is None:
+        return {}
+    metadata = table.schema.metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items() if key != b'pandas'}
+
+
+def write_cache(df: pd.DataFrame, cache_path: str, stamp: dict):
+    """Write a frame as an uncompressed feather file so it can be memory mapped
+
+    The file is written next to the cache and renamed over it, so an interrupted
+    write never leaves a truncated cache and frames still mapping the old file keep
+    their data.
+
+    Args:
+        df (pd.DataFrame): the data to cache
+        cache_path (str): location of the feather cache
+        stamp (dict): description of the inputs, stored in the file metadata
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({key.encode(): value.encode() for key, value in stamp.items()})
+    table = table.replace_schema_metadata(metadata)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), suffix='.tmp')
+    os.close(fd)
+    try:
+        pyarrow.feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
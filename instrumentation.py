@@ -0,0 +1,182 @@
+#Timing instrumentation shared by the analysis scripts
+#Switched on with the DTSC493_PROFILE environment variable, set it to 1 or to the path of the report.
+#When it is off timed() hands back the undecorated function and stage() a do-nothing context,
+#so instrumented code runs at full speed.
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: #not available on Windows
+    resource = None
+
+
+profile_env = 'DTSC493_PROFILE'
+default_report_path = 'profile_report.json'
+enabled = os.environ.get(profile_env, '') not in ('', '0')
+
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _peak_memory_mb():
+    """Peak resident memory of this process so far
+
+    Returns:
+        float: megabytes, None where the platform does not report it
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/1024/1024 if sys.platform == 'darwin' else peak/1024 #bytes on macOS, kilobytes elsewhere
+
+
+class _Stage:
+    """Context manager timing one run of a stage, nested stages are recorded under their parent"""
+    def __init__(self, name: str, rows: int = None):
+        self.name = name
+        self.rows = rows
+        self.path = None
+        self.start = None
+        self.peak_before = None
+        self.child_seconds = 0.0
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = ';'.join([stage.name for stage in stack] + [self.name])
+        stack.append(self)
+        self.peak_before = _peak_memory_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_seconds += seconds
+        peak = _peak_memory_mb()
+        with _lock:
+            stats = _stats.setdefault(self.path, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'rows': 0, 'peak_growth_mb': None})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['self_seconds'] += seconds - self.child_seconds
+            stats['rows'] += self.rows or 0
+            if peak is not None:
+                #how far the stage raised the process's peak, stages that stay below an earlier peak report 0
+                stats['peak_growth_mb'] = max(peak - self.peak_before, stats['peak_growth_mb'] or 0)
+        return False
+
+
+class _NullStage:
+    """Stand in for _Stage when instrumentation is off"""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+def stage(name: str, rows: int = None):
+    """Time a block of code as a named stage
+
+    Args:
+        name (str): name of the stage
+        rows (int, optional): rows processed by the block, can also be set on the returned object. Defaults to None.
+
+    Returns:
+        a context manager
+    """
+    if not enabled:
+        return _null_stage
+    return _Stage(name, rows)
+
+
+def timed(name: str = None, rows=None):
+    """Decorator timing every call of a function as a stage
+
+    Args:
+        name (str, optional): name of the stage. Defaults to the function's qualified name.
+        rows (callable, optional): gives the rows processed from the function's result, e.g. len. Defaults to None.
+
+    Returns:
+        the decorator, which returns the function untouched when instrumentation is off
+    """
+    def decorator(func):
+        if not enabled:
+            return func
+        stage_name = name or func.__qualname__
+
+        def wrapper(*args, **kwargs):
+            with _Stage(stage_name) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(result)
+                return result
+
+        wrapper.__name__ = func.__name__
+        wrapper.__qualname__ = func.__qualname__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+def report():
+    """Statistics of every stage recorded so far in this process
+
+    Returns:
+        list[dict]: one dict per stage path with calls, seconds, self_seconds, rows, rows_per_sec and
+        peak_growth_mb, the most one call raised the peak resident memory of the process
+    """
+    with _lock:
+        stats = {path: dict(values) for path, values in _stats.items()}
+    out = []
+    for path, values in sorted(stats.items(), key=lambda item: -item[1]['seconds']):
+        values['stage'] = path
+        values['rows_per_sec'] = values['rows']/values['seconds'] if values['rows'] and values['seconds'] > 0 else None
+        out.append(values)
+    return out
+
+
+def write_report(path: str = None):
+    """Write the report as json, and as folded stacks next to it for flamegraph tools
+
+    The .folded file has one 'parent;child microseconds' line per stage, the format
+    flamegraph.pl and speedscope read.
+
+    Args:
+        path (str, optional): location of the json report. Defaults to the DTSC493_PROFILE value, or profile_report.json.
+    """
+    if path is None:
+        setting = os.environ.get(profile_env, '')
+        path = setting if setting not in ('', '0', '1') else default_report_path
+    stats = report()
+    with open(path, 'w') as fo:
+        json.dump(stats, fo, indent=2)
+    base, ext = os.path.splitext(path)
+    with open(base + '.folded', 'w') as fo:
+        for values in stats:
+            fo.write('%s %d\n' % (values['stage'], round(values['self_seconds']*1e6)))
+
+
+def reset():
+    """Forget every recorded stage"""
+    with _lock:
+        _stats.clear()
+
+
+if enabled:
+    atexit.register(write_report)
@@ -0,0 +1,58 @@
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from week4.class_wrappers import ClassifierWrapper, _artifact_header, artifact_magic
+
+
+def test_apply_iter_threads_leave_shared_model_alone(tmp_path):
+    rng = np.random.default_rng(0)
+    x_data = rng.normal(size=(500, 4))
+    labels = (x_data[:, 0] > 0).astype(int)
+    trained = ClassifierWrapper()
+    trained.train(x_data, labels, n_estimators=5, n_jobs=2)
+    path = str(tmp_path / 'model.cw')
+    trained.save(path)
+
+    a = ClassifierWrapper.from_file(path)
+    b = ClassifierWrapper.from_file(path)
+    assert a.model is b.model #one cached model per file
+    n_jobs = b.model.get_params()['n_jobs']
+
+    scored = np.concatenate([proba.copy() for proba in a.apply_iter([x_data], chunk_size=128, n_threads=1)])
+
+    assert b.model.get_params()['n_jobs'] == n_jobs
+    np.testing.assert_allclose(scored, b.apply(x_data))
+
+
+def test_decision_tree_round_trip_without_pickle(tmp_path):
+    rng = np.random.default_rng(1)
+    x_data = rng.normal(size=(300, 5))
+    labels = (x_data[:, 1] + x_data[:, 2] > 0).astype(int)
+    trained = ClassifierWrapper()
+    trained.train(x_data, labels, decision_tree=True, max_depth=4)
+    path = str(tmp_path / 'tree.cw')
+    trained.save(path)
+    with open(path, 'rb') as fo:
+        assert b'pickle' not in fo.read()
+
+    loaded = ClassifierWrapper.from_file(path, use_cache=False)
+
+    np.testing.assert_array_equal(loaded.apply(x_data), trained.apply(x_data))
+    assert loaded.pars == trained.pars
+
+
+def test_pickled_model_needs_allow_pickle(tmp_path):
+    trained = ClassifierWrapper()
+    trained.train(np.eye(4), np.array([0, 1, 0, 1]), decision_tree=True)
+    metadata = json.dumps({'pars': trained.pars, 'model_format': 'pickle'}).encode()
+    path = str(tmp_path / 'old_tree.cw')
+    with open(path, 'wb') as fo:
+        fo.write(_artifact_header.pack(artifact_magic, 1, len(metadata)) + metadata + pickle.dumps(trained.model))
+
+    with pytest.raises(ValueError, match='allow_pickle'):
+        ClassifierWrapper.from_file(path, use_cache=False)
+    loaded = ClassifierWrapper.from_file(path, use_cache=False, allow_pickle=True)
+    np.testing.assert_array_equal(loaded.apply(np.eye(4)), trained.apply(np.eye(4)))
@@ -0,0 +1,33 @@
+import os
+
+import pandas as pd
+
+from benchmarks import synthetic
+from week2.nytimes import load_us_counties
+from week8.get_website import demographic_by_zip
+
+
+def truncate(path):
+    with open(path, 'r+b') as fo:
+        fo.truncate(os.path.getsize(path)//2)
+
+
+def test_truncated_nytimes_cache_is_rebuilt(tmp_path):
+    csv_path = synthetic.write_nytimes_csv(str(tmp_path / 'us_counties.csv'), 5, 20)
+    cache_path = str(tmp_path / 'us_counties.feather')
+    expected = load_us_counties(csv_path, cache_path)
+    truncate(cache_path)
+
+    pd.testing.assert_frame_equal(load_us_counties(csv_path, cache_path), expected)
+    pd.testing.assert_frame_equal(load_us_counties(csv_path, cache_path), expected) #read back from the rebuilt cache
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+
+def test_truncated_demographics_cache_is_rebuilt(tmp_path):
+    zip_path, demo_path = synthetic.write_demographics(str(tmp_path), 200)
+    cache_path = str(tmp_path / 'demographics_by_zip.feather')
+    expected = demographic_by_zip(zip_path, demo_path, cache_path)
+    truncate(cache_path)
+
+    pd.testing.assert_frame_equal(demographic_by_zip(zip_path, demo_path, cache_path), expected)
+    pd.testing.assert_frame_equal(demographic_by_zip(zip_path, demo_path, cache_path), expected)
@@ -0,0 +1,106 @@
+import http.server
+import json
+import threading
+
+import pandas as pd
+import pytest
+import tenacity
+
+from week8.get_website import ZipExtractor, iter_checkpoint, loop_through_universities, read_checkpoint, request_page
+
+
+page = '<html><head><script>var x = 1;</script></head><body><p>%s welcomes asian and pacific islander students.</p><footer>1 college ave, pittsburgh, pa %s</footer></body></html>'
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Pages of the stub universities: /ok/<zip> always works, /flaky fails once with a 503, anything else is a 404"""
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path.startswith('/ok/') or (self.path == '/flaky' and self.server.hits[self.path] > 1):
+            status, body = 200, page % (self.path, self.path[-5:] if self.path.startswith('/ok/') else '15282')
+        elif self.path == '/flaky':
+            status, body = 503, 'try again'
+        else:
+            status, body = 404, 'not found'
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    monkeypatch.setattr(request_page.retry, 'wait', tenacity.wait_none()) #retry at once instead of backing off
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def universities(tmp_path):
+    path = tmp_path / 'universities.csv'
+    pd.DataFrame({'University': ['Alpha University', 'Flaky College', 'Broken Institute']}).to_csv(path, index=False)
+    return str(path)
+
+
+def stub_search(server):
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    results = {
+        'alpha university': [base + '/ok/15213', base + '/ok/90210'],
+        'flaky college': [base + '/flaky'],
+        'broken institute': [base + '/missing']
+    }
+
+    def search(query, num=5, stop=5, pause=0):
+        return results[query[:-len(' diversity and inclusion')]]
+    return search
+
+
+def scrape(universities, out_path, server, **kwargs):
+    return loop_through_universities(universities, str(out_path), workers=2, pause=0, host_interval=0, timeout=5, search_function=stub_search(server), **kwargs)
+
+
+def test_scrapes_retries_and_logs_failures(stub_server, universities, tmp_path):
+    out_path = tmp_path / 'scraped.jsonl'
+    assert scrape(universities, out_path, stub_server, zip_extractor=ZipExtractor(frozenset(['15213', '15282']))) == str(out_path)
+    df = read_checkpoint(out_path)
+
+    assert sorted(df['university'].unique()) == ['Alpha University', 'Flaky College']
+    alpha = df.loc[df['university'] == 'Alpha University', :].sort_values('search_index')
+    assert alpha['zip'].iloc[0] == '15213'
+    assert pd.isna(alpha['zip'].iloc[1]) #90210 is not in the valid zips
+    assert alpha['count_asian'].tolist() == [1, 1]
+    assert stub_server.hits['/flaky'] == 2 #the 503 was retried
+    assert stub_server.hits['/missing'] == 1 #a 404 is not retried
+
+    with open(tmp_path / 'scraped.failed') as fo:
+        failed = [json.loads(line) for line in fo]
+    assert [entry['university'] for entry in failed] == ['Broken Institute']
+    assert '404' in failed[0]['error']
+
+
+def test_resume_skips_finished_universities(stub_server, universities, tmp_path):
+    out_path = tmp_path / 'scraped.jsonl'
+    scrape(universities, out_path, stub_server)
+    with open(out_path, 'a') as fo:
+        fo.write('{"university": "Cut Off", "resu') #a line cut off by a crash
+
+    hits = dict(stub_server.hits)
+    scrape(universities, out_path, stub_server)
+
+    assert stub_server.hits['/ok/15213'] == hits['/ok/15213'] #finished, not fetched again
+    assert stub_server.hits['/flaky'] == hits['/flaky']
+    assert stub_server.hits['/missing'] == hits['/missing'] + 1 #failed last time, tried again
+    assert len(read_checkpoint(out_path)) == 3
+    assert sorted(len(batch) for batch in iter_checkpoint(out_path, batch_size=1)) == [1, 2] #one university per batch, in finishing order
+    with open(out_path) as fo:
+        assert all(line.endswith('\n') for line in fo)
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from week2.nytimes import daily_cases, nytimes_dtypes, update_daily_cases
+
+
+def _frame(rows):
+    df = pd.DataFrame(rows, columns=['date', 'county', 'state', 'fips', 'cases', 'deaths'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df.astype(nytimes_dtypes)
+
+
+def test_update_daily_cases_matches_full_rebuild_with_new_counties():
+    fresh = _frame([
+        ('2020-03-01', 'allegheny', 'pennsylvania', 42003, 1, 0),
+        ('2020-03-01', 'new york city', 'new york', None, 5, 0),
+        ('2020-03-02', 'allegheny', 'pennsylvania', 42003, 3, 0),
+        ('2020-03-02', 'new york city', 'new york', None, 9, 0),
+        ('2020-03-03', 'allegheny', 'pennsylvania', 42003, 4, 0),
+        ('2020-03-03', 'brandnew', 'ohio', 39999, 2, 0),
+        ('2020-03-03', 'new york city', 'new york', None, 12, 0),
+        ('2020-03-03', 'unknown', 'texas', None, 7, 0),
+        ('2020-03-04', 'brandnew', 'ohio', 39999, 5, 0),
+        ('2020-03-04', 'unknown', 'texas', None, 8, 0),
+    ])
+    history = fresh.loc[fresh['date'] <= '2020-03-02', :].copy()
+    for column in ['county', 'state']:
+        history[column] = history[column].cat.remove_unused_categories()
+
+    incremental = update_daily_cases(daily_cases(history), fresh)
+    full = daily_cases(fresh)
+
+    columns = ['date', 'county', 'state', 'fips', 'cases', 'cumulative_cases']
+    as_text = {'county': str, 'state': str}
+    pd.testing.assert_frame_equal(incremental[columns].astype(as_text), full[columns].astype(as_text), check_dtype=False)
+    assert incremental['county'].notna().all()
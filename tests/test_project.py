@@ -0,0 +1,26 @@
+import pandas as pd
+
+from week2.nytimes import daily_cases, nytimes_dtypes
+from week2.project import fit_all_counties
+
+
+def test_fit_all_counties_keeps_counties_without_fips():
+    rows = []
+    for day in range(30):
+        date = pd.Timestamp('2020-03-01') + pd.Timedelta(days=day)
+        rows += [
+            (date, 'allegheny', 'pennsylvania', 42003, int(10*1.05**day), 0),
+            (date, 'new york city', 'new york', None, int(100*1.06**day), 0),
+            (date, 'unknown', 'texas', None, int(5*1.04**day), 0),
+            (date, 'unknown', 'ohio', None, 0, 0)
+        ]
+    df = pd.DataFrame(rows, columns=['date', 'county', 'state', 'fips', 'cases', 'deaths']).astype(nytimes_dtypes)
+
+    results = fit_all_counties(daily_cases(df), '2020-03-01', workers=1).set_index(['state', 'county'])
+
+    assert len(results) == 4
+    assert results.loc[('new york', 'new york city'), 'status'] == 'ok'
+    assert results.loc[('texas', 'unknown'), 'status'] == 'ok'
+    assert pd.isna(results.loc[('new york', 'new york city'), 'fips'])
+    assert results.loc[('ohio', 'unknown'), 'status'] == 'skipped' #no cases to start from
+    assert results.loc[('pennsylvania', 'allegheny'), 'fips'] == 42003
@@ -0,0 +1,24 @@
+from benchmarks.synthetic import html_pages
+from week8.get_website import compare_text_extraction, hidden_tags
+
+
+#pages with the markup that trips up line splitting: entities, CRLF and tabs, inline tags, comments, unclosed tags
+edge_pages = {
+    'entities.html': '<html><body><p>Asian &amp; Pacific&nbsp;Islander &lt;students&gt;</p></body></html>',
+    'crlf.html': '<html><body>\r\n<p>first\tline\r\nsecond line</p>\r\n</body></html>',
+    'inline.html': '<html><body><p>one <b>bold</b><i>italic</i> line</p><div>two</div></body></html>',
+    'comments.html': '<html><head><title>Title</title><!-- hidden --></head><body><script>var x = "<p>no</p>";</script><p>kept</p></body></html>',
+    'unclosed.html': '<html><body><p>open paragraph<p>another<ul><li>item one<li>item two</ul></body></html>'
+}
+
+
+def test_streaming_text_matches_beautifulsoup(tmp_path):
+    pages = {'page%d.html' % n: contents for n, contents in enumerate(html_pages(20, paragraphs=10).values())}
+    pages.update(edge_pages)
+    for name, contents in pages.items():
+        (tmp_path / name).write_text(contents, encoding='utf-8')
+
+    comparison = compare_text_extraction(str(tmp_path), skip_tags=hidden_tags)
+
+    assert len(comparison) == len(pages)
+    assert comparison['match'].all(), comparison.loc[~comparison['match'], 'page'].tolist()
@@ -3,11 +3,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import scipy.optimize
+import scipy.special
 import scipy.stats
 from typing import Iterable, List, Tuple
 
+from instrumentation import timed
+from week2.nytimes import CountyIndex, daily_cases, load_us_counties
+
 
 # Two new lines before functions
+@timed('read', rows=len)
 def read(path: str) -> pd.DataFrame:
     """Read in the NYTimes covid data
     Args:
@@ -16,20 +21,19 @@ def read(path: str) -> pd.DataFrame:
         pd.DataFrame: raw NYTimes covid data
     
     """
-    df = pd.read_csv(path)
-    df['date'] = pd.to_datetime(df['date'])
-    df['county'] = df['county'].str.lower()
-    df['state'] = df['state'].str.lower()
-    df['cases'] = df['cases'].diff()
-    df['cases'] = df['cases'].fillna(0)
+    df = load_us_counties(path)
+    df = daily_cases(df)
     return df
 
 
-def fit_daily_cases(df: pd.DataFrame, date: str):
-    date_data = df.loc[df['date'] == pd.to_datetime(date), :]
+@timed('fit_daily_cases')
+def fit_daily_cases(df: pd.DataFrame, date: str, index: CountyIndex = None):
+    if index is None:
+        date_data = df.loc[df['date'] == pd.to_datetime(date), :]
+    else:
+        date_data = index.date(date)
     date_data = date_data['cases'].values
-    date_data = date_data[date_data >= 0]
-    date_data = date_data[date_data < 1000000]
+    date_data = date_data[date_data >= 0] #the NYTimes occasionally revises cumulative counts down
     hist, bins = np.histogram(date_data, bins=20)
     hist = hist/np.sum(hist)  # Also can do hist/hist.sum()
     
@@ -37,6 +41,120 @@ def fit_daily_cases(df: pd.DataFrame, date: str):
     pars, _ = scipy.optimize.curve_fit(scipy.stats.poisson.pmf, bins[:-1], hist, p0=[1])
     print(pars)
 
+
+def _negative_binomial_size(x: np.ndarray, codes: np.ndarray, mean: np.ndarray, size: np.ndarray, max_iter: int = 100, tol: float = 1e-10):
+    """Newton's method on the size parameter of a negative binomial, for every group at once
+
+    With the mean fixed at its MLE, the size r solves
+    sum(digamma(x + r)) - n*digamma(r) + n*log(r/(r + mean)) = 0 in each group.
+    The iteration runs on log(r) so r stays positive, every step is one pass of
+    bincounts over all rows.
+
+    Args:
+        x (np.ndarray): counts of every row
+        codes (np.ndarray): group of every row
+        mean (np.ndarray): mean of every group
+        size (np.ndarray): starting size of every group, nan for groups to skip
+        max_iter (int, optional): most Newton steps. Defaults to 100.
+        tol (float, optional): stop once every step in log(r) is smaller. Defaults to 1e-10.
+
+    Returns:
+        np.ndarray, np.ndarray: the size of every group, and the Newton steps each took
+    """
+    n_groups = len(mean)
+    n = np.bincount(codes, minlength=n_groups)
+    log_size = np.log(size)
+    active = np.isfinite(log_size)
+    iterations = np.zeros(n_groups, dtype=int)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        r = np.exp(log_size)
+        r_rows = r[codes]
+        score = (np.bincount(codes, scipy.special.digamma(x + r_rows), n_groups) - n*scipy.special.digamma(r)
+                 + n*np.log(r/(r + mean)))
+        slope = (np.bincount(codes, scipy.special.polygamma(1, x + r_rows), n_groups) - n*scipy.special.polygamma(1, r)
+                 + n/r - n/(r + mean))
+        step = np.clip(np.where(active, score/(r*slope), 0), -2, 2) #Newton in log(r), d score/d log(r) = r*slope
+        log_size = log_size - step
+        iterations += active
+        active &= np.abs(step) > tol
+    return np.exp(log_size), iterations
+
+
+@timed('fit_daily_cases_all', rows=len)
+def fit_daily_cases_all(df: pd.DataFrame, negative_binomial: bool = False) -> pd.DataFrame:
+    """Maximum likelihood Poisson fit of the daily cases across counties, for every date at once
+
+    The Poisson MLE is the mean, so every date is fit by bincount sums over the
+    dates' codes instead of a histogram and an optimizer run per date.
+    The dispersion index is variance/mean, 1 for Poisson data, and the Pearson
+    chi-squared, (n - 1)*variance/mean on n - 1 degrees of freedom, tests it.
+    With negative_binomial the size r of a negative binomial with the same mean
+    is fit as well, by Newton's method from the method of moments estimate.
+    Dates that are not overdispersed keep r = inf, where it becomes the Poisson.
+
+    Args:
+        df (pd.DataFrame): NYTimes data with daily cases, as from read
+        negative_binomial (bool, optional): also fit a negative binomial. Defaults to False.
+
+    Returns:
+        pd.DataFrame: one row per date with n_counties, mean, variance, dispersion, pearson_chi2, dof, pearson_p,
+            poisson_loglik and poisson_aic, with negative_binomial also nb_size, nb_p, nb_loglik, nb_aic and nb_iterations
+    """
+    df = df.loc[df['cases'] >= 0, ['date', 'cases']] #the NYTimes occasionally revises cumulative counts down
+    codes, dates = pd.factorize(df['date'], sort=True)
+    x = df['cases'].to_numpy(dtype=float)
+    n_dates = len(dates)
+
+    n = np.bincount(codes, minlength=n_dates)
+    total = np.bincount(codes, x, n_dates)
+    log_factorials = np.bincount(codes, scipy.special.gammaln(x + 1), n_dates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total/n
+        variance = np.bincount(codes, (x - mean[codes])**2, n_dates)/(n - 1)
+        dispersion = variance/mean
+        pearson_chi2 = (n - 1)*dispersion
+    dof = n - 1
+    poisson_loglik = scipy.special.xlogy(total, mean) - total - log_factorials
+
+    fits = pd.DataFrame({
+        'date': dates,
+        'n_counties': n,
+        'mean': mean,
+        'variance': variance,
+        'dispersion': dispersion,
+        'pearson_chi2': pearson_chi2,
+        'dof': dof,
+        'pearson_p': scipy.stats.chi2.sf(pearson_chi2, dof),
+        'poisson_loglik': poisson_loglik,
+        'poisson_aic': 2 - 2*poisson_loglik
+    })
+    if not negative_binomial:
+        return fits
+
+    overdispersed = (n > 1) & (variance > mean) & (mean > 0)
+    start = np.full(n_dates, np.nan)
+    start[overdispersed] = mean[overdispersed]**2/(variance[overdispersed] - mean[overdispersed])
+    size, iterations = _negative_binomial_size(x, codes, mean, start)
+    size[~overdispersed] = np.inf
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_rows = size[codes]
+        nb_loglik = (np.bincount(codes, scipy.special.gammaln(x + r_rows) - scipy.special.gammaln(r_rows), n_dates) - log_factorials
+                     + n*size*np.log(size/(size + mean)) + scipy.special.xlogy(total, mean/(size + mean)))
+        nb_p = np.where(overdispersed, size/(size + mean), 1.0) #scipy.stats.nbinom(nb_size, nb_p) parametrization
+    nb_loglik[~overdispersed] = poisson_loglik[~overdispersed]
+
+    fits['nb_size'] = size
+    fits['nb_p'] = nb_p
+    fits['nb_loglik'] = nb_loglik
+    fits['nb_aic'] = 4 - 2*nb_loglik
+    fits['nb_iterations'] = iterations
+    return fits
+
+
 if __name__ == '__main__':
     df = read('data\\us_counties.csv')
-    fit_daily_cases(df, '2022-01-05')
\ No newline at end of file
+    fit_daily_cases(df, '2022-01-05')
+    print(fit_daily_cases_all(df, negative_binomial=True)[['date', 'mean', 'dispersion', 'pearson_p', 'nb_size']])
\ No newline at end of file
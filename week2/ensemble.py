@@ -0,0 +1,217 @@
+#Stochastic SIR ensembles with forecast bands, for uncertainty around the deterministic sir()
+import concurrent.futures
+import os
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+
+#compartments recorded for every day, new_infections is the model's counterpart of daily cases
+ensemble_compartments = ['S', 'I', 'R', 'new_infections']
+
+
+def stochastic_sir(s, i, r, r_naught, d, n_days, n_members: int, rng: np.random.Generator):
+    """Binomial chain SIR Model, many ensemble members at once
+
+    Every day each susceptible is infected with probability 1 - exp(-beta*I/N)
+    and each infected recovers with probability 1 - exp(-gamma), so the counts stay
+    whole and non-negative. Its mean is close to sir(), which takes the same daily
+    steps with rates in place of probabilities, while many are infected.
+
+    Args:
+        s (int): initial susceptible population
+        i (int): initial infected population
+        r (int): initial recovered population
+        r_naught (float): the r naught to use to propegate
+        d (float): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+        n_members (int): number of ensemble members
+        rng (np.random.Generator): source of randomness
+
+    Returns:
+        np.ndarray: array of shape (n_members, n_days+1, 4) holding S, I, R and new infections for each day
+    """
+    output = np.empty((n_members, n_days + 1, len(ensemble_compartments)), dtype=np.int64)
+    for day, state in enumerate(_stochastic_days(s, i, r, r_naught, d, n_days, n_members, rng)):
+        output[:, day] = state
+    return output
+
+
+def _stochastic_days(s, i, r, r_naught, d, n_days, n_members, rng):
+    """Yield the (n_members, 4) state of the binomial chain day by day, see stochastic_sir"""
+    N = s + i + r
+    gamma = 1.0/d
+    beta = r_naught * gamma
+    s = np.full(n_members, s, dtype=np.int64)
+    i = np.full(n_members, i, dtype=np.int64)
+    r = np.full(n_members, r, dtype=np.int64)
+    infections = np.zeros(n_members, dtype=np.int64)
+    p_recover = -np.expm1(-gamma)
+    yield np.stack([s, i, r, infections], axis=1)
+    for day in range(1, n_days + 1):
+        infections = rng.binomial(s, -np.expm1(-beta*i/N))
+        recoveries = rng.binomial(i, p_recover)
+        s = s - infections
+        i = i + infections - recoveries
+        r = r + recoveries
+        yield np.stack([s, i, r, infections], axis=1)
+
+
+class DailyHistogram:
+    """Per day histograms of ensemble values on log spaced bins, for quantiles without the trajectories
+
+    Bin 0 holds the zeros, the rest are log spaced from 1 to max_value with
+    bins_per_decade bins per factor of ten, so a quantile is within a factor of
+    10**(1/bins_per_decade) of the exact one (2.3% at the default 100) however
+    many members are added. Memory depends on the days and the bins, not the
+    members. Histograms of separate batches are merged by adding them.
+    """
+    def __init__(self, n_days: int, n_series: int, max_value: float, bins_per_decade: int = 100):
+        n_log_bins = max(int(np.ceil(np.log10(max(max_value, 1) + 1)*bins_per_decade)), 1)
+        self.edges = np.concatenate([[0.0], np.logspace(0, np.log10(max(max_value, 1) + 1), n_log_bins + 1)])
+        self.counts = np.zeros((n_days + 1, n_series, len(self.edges) - 1), dtype=np.int64)
+        self.sums = np.zeros((n_days + 1, n_series))
+        self.n = 0
+
+    def add(self, day: int, values: np.ndarray):
+        """Count the values of one day
+
+        Args:
+            day (int): the day
+            values (np.ndarray): array of shape (n_members, n_series)
+        """
+        n_series, n_bins = self.counts.shape[1:]
+        bins = np.clip(np.searchsorted(self.edges, values, side='right') - 1, 0, n_bins - 1)
+        flat = bins + n_bins*np.arange(n_series)
+        self.counts[day] += np.bincount(flat.ravel(), minlength=n_series*n_bins).reshape(n_series, n_bins)
+        self.sums[day] += values.sum(axis=0)
+        if day == 0:
+            self.n += len(values)
+
+    def merge(self, other: 'DailyHistogram'):
+        """Add the counts of a histogram with the same bins
+
+        Args:
+            other (DailyHistogram): histogram of other members
+        """
+        self.counts += other.counts
+        self.sums += other.sums
+        self.n += other.n
+
+    def mean(self) -> np.ndarray:
+        """Exact mean of every day and series
+
+        Returns:
+            np.ndarray: array of shape (n_days+1, n_series)
+        """
+        return self.sums/self.n
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Estimated quantiles of every day and series
+
+        Within a log bin the quantile is interpolated geometrically.
+
+        Args:
+            qs (list[float]): quantiles between 0 and 1
+
+        Returns:
+            np.ndarray: array of shape (n_days+1, n_series, len(qs))
+        """
+        cumulative = np.cumsum(self.counts, axis=-1)
+        out = np.empty(self.counts.shape[:2] + (len(qs),))
+        for k, q in enumerate(qs):
+            target = q*self.n
+            bins = np.minimum((cumulative < target).sum(axis=-1), self.counts.shape[-1] - 1)
+            below = np.where(bins > 0, np.take_along_axis(cumulative, np.maximum(bins - 1, 0)[..., None], -1)[..., 0], 0)
+            inside = np.take_along_axis(self.counts, bins[..., None], -1)[..., 0]
+            fraction = np.clip((target - below)/np.maximum(inside, 1), 0, 1)
+            lower, upper = self.edges[bins], self.edges[bins + 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[..., k] = np.where(bins == 0, 0.0, lower*(upper/lower)**fraction)
+        return out
+
+
+def _simulate_batch(job):
+    """Simulate one batch of members into a histogram, for sir_ensemble
+
+    Args:
+        job (tuple): seed sequence, members, s, i, r, r_naught, d, n_days and bins_per_decade of the batch
+
+    Returns:
+        DailyHistogram: the batch's histogram
+    """
+    seed, n_members, s, i, r, r_naught, d, n_days, bins_per_decade = job
+    rng = np.random.default_rng(seed)
+    histogram = DailyHistogram(n_days, len(ensemble_compartments), s + i + r, bins_per_decade)
+    for day, state in enumerate(_stochastic_days(s, i, r, r_naught, d, n_days, n_members, rng)):
+        histogram.add(day, state)
+    return histogram
+
+
+def _merge_histograms(histograms) -> DailyHistogram:
+    """Merge histograms as they arrive, so only two are held at a time
+
+    Args:
+        histograms (iterable of DailyHistogram): histograms with the same bins
+
+    Returns:
+        DailyHistogram: their sum
+    """
+    total = None
+    for histogram in histograms:
+        if total is None:
+            total = histogram
+        else:
+            total.merge(histogram)
+    return total
+
+
+@timed('sir_ensemble')
+def sir_ensemble(s, i, r, r_naught, d, n_days, n_members: int = 1000, seed=None, quantiles=(0.05, 0.5, 0.95),
+                 batch_size: int = 10000, workers: int = 1, bins_per_decade: int = 100) -> pd.DataFrame:
+    """Forecast bands of the stochastic SIR Model from a large ensemble
+
+    Members are simulated batch_size at a time and only counted into per day
+    histograms, so memory stays bounded however many members are run. Each batch
+    gets its own child of the seed's SeedSequence, so the result depends on the
+    seed and batch_size but not on the number of workers.
+
+    Args:
+        s (int): initial susceptible population
+        i (int): initial infected population
+        r (int): initial recovered population
+        r_naught (float): the r naught to use to propegate
+        d (float): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+        n_members (int, optional): number of ensemble members. Defaults to 1000.
+        seed (int or np.random.SeedSequence, optional): seed of the ensemble. Defaults to fresh entropy.
+        quantiles (tuple, optional): quantiles to report. Defaults to (0.05, 0.5, 0.95).
+        batch_size (int, optional): members simulated at once. Defaults to 10000.
+        workers (int, optional): number of processes, 1 runs in this process, None uses every core. Defaults to 1.
+        bins_per_decade (int, optional): histogram resolution, see DailyHistogram. Defaults to 100.
+
+    Returns:
+        pd.DataFrame: one row per day and compartment with mean and a q<quantile> column per quantile
+    """
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(batch_size, n_members - start) for start in range(0, n_members, batch_size)]
+    jobs = [(child, size, s, i, r, r_naught, d, n_days, bins_per_decade) for child, size in zip(seed.spawn(len(sizes)), sizes)]
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers == 1 or len(jobs) == 1:
+        total = _merge_histograms(map(_simulate_batch, jobs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            total = _merge_histograms(executor.map(_simulate_batch, jobs))
+
+    n_compartments = len(ensemble_compartments)
+    bands = pd.DataFrame({
+        'day': np.repeat(np.arange(n_days + 1), n_compartments),
+        'compartment': np.tile(ensemble_compartments, n_days + 1),
+        'mean': total.mean().ravel()
+    })
+    values = total.quantiles(quantiles)
+    for k, q in enumerate(quantiles):
+        bands['q%g' % q] = values[..., k].ravel()
+    return bands
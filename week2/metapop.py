@@ -0,0 +1,173 @@
+#Metapopulation SIR: every county stepped together, coupled through a sparse mobility matrix
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from instrumentation import timed
+
+
+#columns of the census 2010 ZCTA to county relationship file (zcta_county_rel_10.txt)
+#ZPOPPCT is the percent of the ZCTA's population living in that county
+relationship_columns = {
+    'ZCTA5': 'zcta',
+    'GEOID': 'fips',
+    'ZPOPPCT': 'percent_of_zcta'
+}
+
+
+def county_populations(demo_path: str, relationship_path: str) -> pd.Series:
+    """Population of every county from the census ZCTA demographics
+
+    The demographics are the same DP05 csv demographic_by_zip reads. Each ZCTA's
+    population is split across the counties it overlaps by the relationship file.
+
+    Args:
+        demo_path (str): location of the census demographics csv
+        relationship_path (str): location of the ZCTA to county relationship file
+
+    Returns:
+        pd.Series: population indexed by county fips
+    """
+    demo_df = pd.read_csv(demo_path, skiprows=range(1,2), usecols=['NAME', 'DP05_0001E']) #second row holds the labels
+    demo_df = demo_df.rename(columns={'NAME': 'zcta', 'DP05_0001E': 'pop_total'})
+    demo_df['zcta'] = demo_df['zcta'].str[5:].astype(int) #keeps zcta code without 'zcta5'
+
+    relationship = pd.read_csv(relationship_path, usecols=list(relationship_columns), dtype={'ZCTA5': int, 'GEOID': int, 'ZPOPPCT': float})
+    relationship = relationship.rename(columns=relationship_columns)
+
+    comb = relationship.merge(demo_df, on='zcta', how='inner')
+    comb['population'] = comb['pop_total'].astype(float)*comb['percent_of_zcta']/100
+    return comb.groupby('fips')['population'].sum()
+
+
+def load_county_adjacency(path: str, fips) -> scipy.sparse.csr_matrix:
+    """Read the census county adjacency file into a sparse matrix
+
+    Reads both layouts of the file: the older tab separated one, where the county
+    is only named on the first line of its neighbors, and the newer pipe separated
+    one with a header. Counties are not their own neighbors, and counties outside
+    fips are dropped.
+
+    Args:
+        path (str): location of county_adjacency.txt
+        fips (array-like): county fips codes giving the order of the rows and columns
+
+    Returns:
+        scipy.sparse.csr_matrix: symmetric 0/1 matrix, 1 where two counties border each other
+    """
+    with open(path, 'r', encoding='latin-1') as fo:
+        pipe_separated = '|' in fo.readline()
+    if pipe_separated:
+        pairs = pd.read_csv(path, sep='|', dtype=str, encoding='latin-1')
+    else:
+        pairs = pd.read_csv(path, sep='\t', header=None, dtype=str, encoding='latin-1')
+    pairs = pairs.iloc[:, :4].ffill()
+    county = pairs.iloc[:, 1].astype(int).to_numpy()
+    neighbor = pairs.iloc[:, 3].astype(int).to_numpy()
+
+    position = pd.Series(np.arange(len(fips)), index=np.asarray(fips, dtype=int))
+    rows = position.reindex(county).to_numpy()
+    cols = position.reindex(neighbor).to_numpy()
+    keep = ~np.isnan(rows) & ~np.isnan(cols) & (county != neighbor)
+    rows, cols = rows[keep].astype(int), cols[keep].astype(int)
+
+    adjacency = scipy.sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(fips), len(fips))).tocsr()
+    adjacency = adjacency.maximum(adjacency.T) #the file lists both directions, make sure of it
+    adjacency.data[:] = 1.0
+    return adjacency
+
+
+def mobility_matrix(adjacency: scipy.sparse.spmatrix, mobility: float = 0.05) -> scipy.sparse.csr_matrix:
+    """Coupling matrix from county adjacency
+
+    Row j says where the residents of county j have their contacts: 1 - mobility
+    of them at home and mobility spread evenly over the neighboring counties.
+    Counties without neighbors keep all their contacts at home.
+
+    Args:
+        adjacency (scipy.sparse.spmatrix): 0/1 adjacency, as from load_county_adjacency
+        mobility (float, optional): share of contacts made in neighboring counties. Defaults to 0.05.
+
+    Returns:
+        scipy.sparse.csr_matrix: row stochastic matrix of shape (n_counties, n_counties)
+    """
+    adjacency = scipy.sparse.csr_matrix(adjacency, dtype=float)
+    neighbors = np.asarray(adjacency.sum(axis=1)).ravel()
+    away = np.where(neighbors > 0, mobility, 0.0)
+    spread = scipy.sparse.diags(np.divide(away, neighbors, out=np.zeros_like(away), where=neighbors > 0)) @ adjacency
+    return (spread + scipy.sparse.diags(1 - away)).tocsr()
+
+
+def initial_state(df: pd.DataFrame, fips, populations, date: str, d: float = 10):
+    """Starting S, I, R of every county from the NYTimes data
+
+    Everyone counted in the last d days before date is infected, earlier cases
+    are recovered. Counties without data on that date start with no cases.
+
+    Args:
+        df (pd.DataFrame): NYTimes data with daily and cumulative cases, as from daily_cases
+        fips (array-like): county fips codes giving the order of the counties
+        populations (array-like): population of each county
+        date (str): day the simulation starts
+        d (float, optional): days of infection. Defaults to 10.
+
+    Returns:
+        np.ndarray, np.ndarray, np.ndarray: s, i and r of every county
+    """
+    date = pd.to_datetime(date)
+    fips = np.asarray(fips, dtype=int)
+    populations = np.asarray(populations, dtype=float)
+    recent = df.loc[(df['date'] > date - pd.Timedelta(days=d)) & (df['date'] <= date) & df['fips'].notna(), :]
+    i = recent.groupby('fips', observed=True)['cases'].sum().reindex(fips, fill_value=0).to_numpy(dtype=float)
+    today = df.loc[(df['date'] == date) & df['fips'].notna(), :]
+    total = today.set_index('fips')['cumulative_cases'].reindex(fips, fill_value=0).to_numpy(dtype=float)
+    i = np.clip(i, 0, total)
+    r = total - i
+    return populations - i - r, i, r
+
+
+@timed('metapop_sir')
+def metapop_sir(s, i, r, r_naught, d, n_days: int, coupling: scipy.sparse.spmatrix = None, record_every: int = 1):
+    """SIR Model of many coupled counties, stepped together
+
+    Same discrete steps as sir(), except that the residents of county j are
+    infected at beta*S_j*(coupling @ (I/N))_j, by the prevalence of the counties
+    they have their contacts in. Each day costs one sparse product, so time and
+    memory grow with the counties and their neighbors, not counties squared.
+    Without coupling every county runs on its own, as in sir_batch.
+
+    Args:
+        s (array-like): initial susceptible population of every county
+        i (array-like): initial infected population of every county
+        r (array-like): initial recovered population of every county
+        r_naught (float or array-like): the r naught to use to propegate, one for all or one per county
+        d (float or array-like): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+        coupling (scipy.sparse.spmatrix, optional): row stochastic contact matrix, as from mobility_matrix. Defaults to None.
+        record_every (int, optional): keep every record_every-th day, to save memory on long runs. Defaults to 1.
+
+    Returns:
+        np.ndarray: array of shape (n_days//record_every+1, n_counties, 3) holding S,I,R of the recorded days
+    """
+    s, i, r = [v.astype(float) for v in np.broadcast_arrays(*[np.atleast_1d(v) for v in (s, i, r)])]
+    N = s + i + r
+    gamma = 1.0/np.asarray(d, dtype=float)
+    beta = np.asarray(r_naught, dtype=float) * gamma
+    coupling = None if coupling is None else scipy.sparse.csr_matrix(coupling)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse_N = np.where(N > 0, 1/N, 0.0)
+
+    output = np.empty((n_days//record_every + 1, len(s), 3))
+    output[0] = np.stack([s, i, r], axis=1)
+    for day in range(1, n_days + 1):
+        prevalence = i*inverse_N
+        if coupling is not None:
+            prevalence = coupling @ prevalence
+        infections = beta*s*prevalence
+        recoveries = gamma*i
+        s = s - infections
+        i = i + infections - recoveries
+        r = r + recoveries
+        if day % record_every == 0:
+            output[day//record_every] = np.stack([s, i, r], axis=1)
+    return output
@@ -0,0 +1,282 @@
+#Shared loading of the NYTimes us_counties.csv for the week2 scripts
+import hashlib
+import os.path
+import numpy as np
+import pandas as pd
+from typing import List
+from feather_cache import cache_stamp, file_stamp, read_cache, write_cache
+from instrumentation import timed
+
+
+#dtypes of the compact columnar cache, county and state are lowercased before they become categories
+nytimes_dtypes = {
+    'county': 'category',
+    'state': 'category',
+    'fips': 'Int32', #nullable, the NYTimes leaves fips empty for unknown counties and New York City
+    'cases': 'int32',
+    'deaths': 'Int32'
+}
+
+
+def _file_hash(path: str) -> str:
+    """Hash a file without reading it into memory at once
+
+    Args:
+        path (str): location of the file
+
+    Returns:
+        str: sha256 hex digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fo:
+        for block in iter(lambda: fo.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path_for(path: str) -> str:
+    """Default location of the columnar cache, next to the csv
+
+    Args:
+        path (str): location of the NYTimes csv
+
+    Returns:
+        str: location of the feather cache
+    """
+    base, ext = os.path.splitext(path)
+    return base + '.feather'
+
+
+def parse_us_counties(path: str) -> pd.DataFrame:
+    """Parse the NYTimes csv into compact dtypes
+
+    Args:
+        path (str): location of NYTimes data
+
+    Returns:
+        pd.DataFrame: NYTimes data with datetime dates, categorical lowercase county and state, and int32 counts
+    """
+    df = pd.read_csv(path, dtype={'county': str, 'state': str, 'fips': 'Int32', 'cases': 'int32', 'deaths': 'Int32'}, parse_dates=['date'])
+    df['county'] = df['county'].str.lower()
+    df['state'] = df['state'].str.lower()
+    return df.astype(nytimes_dtypes)
+
+
+@timed('load_us_counties', rows=len)
+def load_us_counties(path: str, cache_path: str = None, check_hash: bool = False) -> pd.DataFrame:
+    """Load the NYTimes data, going through a columnar cache
+
+    The csv is parsed once and written to a feather file. Later calls memory map
+    that file and skip parsing until the csv's mtime or size changes. With
+    check_hash a changed mtime falls back to comparing the content hash, so
+    copying or touching the csv does not force a rebuild.
+
+    Args:
+        path (str): location of NYTimes data
+        cache_path (str, optional): location of the feather cache. Defaults to the csv path with a .feather extension.
+        check_hash (bool, optional): compare content hashes when the mtime or size differ. Defaults to False.
+
+    Returns:
+        pd.DataFrame: NYTimes data with datetime dates, categorical lowercase county and state, and int32 counts
+    """
+    cache_path = cache_path_for(path) if cache_path is None else cache_path
+    stamp = file_stamp(path)
+    table = read_cache(cache_path)
+    cached = cache_stamp(table)
+
+    fresh = bool(cached) and all(cached.get(key) == value for key, value in stamp.items())
+    if not fresh and check_hash and 'source_sha256' in cached:
+        fresh = cached['source_sha256'] == _file_hash(path)
+        if fresh:
+            #same content under a new mtime or size, store them so later loads skip the hash
+            stamp['source_sha256'] = cached['source_sha256']
+            df = table.to_pandas()
+            write_cache(df, cache_path, stamp)
+            return df
+
+    if not fresh:
+        df = parse_us_counties(path)
+        if check_hash:
+            stamp['source_sha256'] = _file_hash(path)
+        write_cache(df, cache_path, stamp)
+        return df
+
+    return table.to_pandas()
+
+
+#columns that identify one county, fips alone is empty for unknown counties and New York City
+county_keys = ['fips', 'state', 'county']
+
+
+def _county_starts(df: pd.DataFrame) -> np.ndarray:
+    """Flag the first row of each county in a frame sorted by county_keys
+
+    Args:
+        df (pd.DataFrame): NYTimes data sorted by county and date
+
+    Returns:
+        np.ndarray: boolean array, True where a new county begins
+    """
+    starts = np.ones(len(df), dtype=bool)
+    changed = np.zeros(max(len(df) - 1, 0), dtype=bool)
+    for key in county_keys:
+        if isinstance(df[key].dtype, pd.CategoricalDtype):
+            values = df[key].cat.codes.to_numpy()
+        else:
+            values = df[key].to_numpy(dtype='int64', na_value=-1)
+        changed |= values[1:] != values[:-1]
+    starts[1:] = changed
+    return starts
+
+
+@timed('daily_cases', rows=len)
+def daily_cases(df: pd.DataFrame) -> pd.DataFrame:
+    """Turn cumulative cases into daily new cases within each county
+
+    The frame is sorted by county and date and differenced in one vectorized pass,
+    so the first day of a county never subtracts the previous county's total. The
+    first day of a county keeps its cumulative count, and the cumulative count is
+    kept in cumulative_cases so new dates can be appended later.
+
+    Args:
+        df (pd.DataFrame): NYTimes data with cumulative cases
+
+    Returns:
+        pd.DataFrame: NYTimes data sorted by county and date with daily cases
+    """
+    df = df.sort_values(county_keys + ['date'], kind='stable').reset_index(drop=True)
+    cumulative = df['cases'].to_numpy()
+    cases = np.diff(cumulative, prepend=0)
+    starts = _county_starts(df)
+    cases[starts] = cumulative[starts]
+    df['cumulative_cases'] = cumulative
+    df['cases'] = cases
+    return df
+
+
+def _concat_categorical(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate frames while keeping their categorical columns categorical
+
+    Args:
+        frames (List[pd.DataFrame]): frames with the same columns
+
+    Returns:
+        pd.DataFrame: the concatenated frame
+    """
+    frames = [frame.copy() for frame in frames]
+    for column in frames[0]:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([frame[column] for frame in frames], sort_categories=True).categories
+            for frame in frames:
+                frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def update_daily_cases(history: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """Append the new dates of a fresh NYTimes drop to already differenced data
+
+    Only the rows after the last date in history are differenced, against the last
+    cumulative count of each county in history.
+
+    Args:
+        history (pd.DataFrame): output of daily_cases or update_daily_cases
+        fresh (pd.DataFrame): NYTimes data with cumulative cases, as from load_us_counties
+
+    Returns:
+        pd.DataFrame: history with the new dates appended, sorted by county and date
+    """
+    new_rows = fresh.loc[fresh['date'] > history['date'].max(), :]
+    if len(new_rows) == 0:
+        return history
+
+    last_rows = np.append(_county_starts(history)[1:], True)
+    carried = history.loc[last_rows, fresh.columns].copy()
+    carried['cases'] = history.loc[last_rows, 'cumulative_cases'].to_numpy()
+
+    new_rows = new_rows.assign(carried=False)
+    carried = carried.assign(carried=True)
+    appended = daily_cases(_concat_categorical([carried, new_rows]))
+    appended = appended.loc[~appended['carried'], :].drop(columns='carried')
+
+    #categories are merged by _concat_categorical, casting to history's would drop counties new in fresh
+    dtypes = {column: dtype for column, dtype in history.dtypes.items() if not isinstance(dtype, pd.CategoricalDtype)}
+    combined = _concat_categorical([history, appended.astype(dtypes)])
+    return combined.sort_values(county_keys + ['date'], kind='stable').reset_index(drop=True)
+
+
+class CountyIndex:
+    """Prebuilt lookup of the NYTimes data by county and date
+
+    The data is sorted by county and date once, so every county is a contiguous
+    block of rows and a date range within it is found by binary search instead of
+    scanning the whole frame.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.sort_values(county_keys + ['date'], kind='stable').reset_index(drop=True)
+        self.dates = self.df['date'].to_numpy()
+        self.bounds_by_fips = {}
+        self.bounds_by_name = {}
+        self.date_order = np.argsort(self.dates, kind='stable')
+        self.sorted_dates = self.dates[self.date_order]
+
+        starts = np.flatnonzero(_county_starts(self.df))
+        stops = np.append(starts[1:], len(self.df))
+        fips = self.df['fips'].to_numpy(dtype='int64', na_value=-1)[starts]
+        counties = self.df['county'].to_numpy()[starts]
+        states = self.df['state'].to_numpy()[starts]
+        for start, stop, code, county, state in zip(starts, stops, fips, counties, states):
+            if code != -1:
+                self.bounds_by_fips[int(code)] = (start, stop)
+            self.bounds_by_name[(county, state)] = (start, stop)
+
+    def resolve(self, county: str, state: str) -> int:
+        """Find the fips code of a county by name
+
+        Args:
+            county (str): county name
+            state (str): state name
+
+        Returns:
+            int: fips code of the county, None if the NYTimes has no fips for it
+        """
+        start, stop = self.bounds_by_name[(county.lower(), state.lower())]
+        fips = self.df['fips'].iloc[start]
+        return None if pd.isna(fips) else int(fips)
+
+    def county(self, county: str = None, state: str = None, from_date: str = None, to_date: str = None, fips: int = None) -> pd.DataFrame:
+        """Rows of one county, optionally limited to a date range
+
+        Args:
+            county (str, optional): county name, ignored if fips is set
+            state (str, optional): state name, ignored if fips is set
+            from_date (str, optional): first date to include. Defaults to the first date of the county.
+            to_date (str, optional): last date to include. Defaults to the last date of the county.
+            fips (int, optional): county code, overrides county, state. Defaults to None.
+
+        Returns:
+            pd.DataFrame: a contiguous slice of the indexed data
+        """
+        if fips is None:
+            start, stop = self.bounds_by_name[(county.lower(), state.lower())]
+        else:
+            start, stop = self.bounds_by_fips[int(fips)]
+        dates = self.dates[start:stop]
+        if from_date is not None:
+            start = start + np.searchsorted(dates, np.datetime64(pd.to_datetime(from_date)), side='left')
+        if to_date is not None:
+            stop = stop - len(dates) + np.searchsorted(dates, np.datetime64(pd.to_datetime(to_date)), side='right')
+        return self.df.iloc[start:stop]
+
+    def date(self, date: str) -> pd.DataFrame:
+        """Rows of every county on one date
+
+        Args:
+            date (str): the date to look up
+
+        Returns:
+            pd.DataFrame: the rows of the indexed data on that date
+        """
+        date = np.datetime64(pd.to_datetime(date))
+        start = np.searchsorted(self.sorted_dates, date, side='left')
+        stop = np.searchsorted(self.sorted_dates, date, side='right')
+        return self.df.take(self.date_order[start:stop])
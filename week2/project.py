@@ -1,11 +1,20 @@
 #Imports at the top
+import collections
+import concurrent.futures
+import os
+import time
 import numpy as np
 import pandas as pd
+import scipy.integrate
 import scipy.optimize
 from typing import Iterable, List, Tuple
 
+from instrumentation import timed
+from week2.nytimes import CountyIndex, county_keys, daily_cases, load_us_counties, nytimes_dtypes
+
 
 #Two new lines before functions
+@timed('read', rows=len)
 def read(path:str):
     """Read in the NYTimes covid data
     
@@ -17,18 +26,16 @@ def read(path:str):
 
      """
 
-    df = pd.read_csv(path)
-    df['county'] = df['county'].str.lower()
-    df['state'] = df['state'].str.lower()
+    df = load_us_counties(path)
     #df = df.loc[df['state'] == 'Pennsylvania']
-    df['cases'] = df['cases'].diff()
-    df['cases'] = df['cases'].fillna(0)
+    df = daily_cases(df)
     return df
 
 
 #Two lines before new functions
 #except for class methods, where it's one line
-def subset_county(df:pd.DataFrame, county: str, state: str, from_date: str, fips: int = None):
+@timed('subset_county', rows=len)
+def subset_county(df:pd.DataFrame, county: str, state: str, from_date: str, fips: int = None, index: CountyIndex = None):
     """Subset the data to a specific county and time range
 
     Args:
@@ -37,17 +44,20 @@ def subset_county(df:pd.DataFrame, county: str, state: str, from_date: str, fips
         state (str): state for subset, ignored if fips is set
         from_date (str): first date to include
         fips (int, optional): county code, overrides county, state. Defaults to none. 
+        index (CountyIndex, optional): prebuilt index of df, avoids scanning the whole frame. Defaults to none.
 
     Returns:
         pd.DataFrame: a subset of the original dataframe specific to a county and time range
     """
+    if index is not None:
+        return index.county(county, state, from_date=from_date, fips=fips).reset_index(drop = True)
+
     if fips is None:
         df = df.loc[df['county'] == county.lower(), :]
         df = df.loc[df['state'] == state.lower(), :]
     else:
         df = df.loc[df['fips'] == fips, :]
 
-    df['date'] = pd.to_datetime(df['date'])
     df = df.loc[df['date'] >= pd.to_datetime(from_date), :]
 
     return df.reset_index(drop = True)
@@ -83,29 +93,406 @@ def sir(s, i, r, r_naught, d, n_days):
     return output
 
 
-def fit_rnaught(cases: pd.Series, population: int = 1250578):
+def sir_batch(s, i, r, r_naught, d, n_days):
+    """SIR Model that integrates many parameter sets over time at once
+
+    Every argument except n_days may be a scalar or an array, they are broadcast
+    against each other so that each element is one independent trajectory. The
+    arithmetic is done in the same order as sir(), so a single parameter set gives
+    exactly the same numbers. A single parameter set is run through sir() itself,
+    plain floats step a day much faster than length one arrays.
+
+    Args:
+        s (array-like): initial susceptible population
+        i (array-like): initial infected population
+        r (array-like): initial recovered population
+        r_naught (array-like): the r naught to use to propegate
+        d (array-like): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+
+    Returns:
+        np.ndarray: array of shape (n_params, n_days+1, 3) holding S,I,R for each day
+    """
+    if all(np.ndim(v) == 0 for v in (s, i, r, r_naught, d)):
+        return np.array(sir(*[float(v) for v in (s, i, r, r_naught, d)], n_days))[None]
+    s, i, r, r_naught, d = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in (s, i, r, r_naught, d)])
+    s, i, r = s.ravel(), i.ravel(), r.ravel()
+    N = s + i + r
+    gamma = 1.0/d.ravel()
+    beta = r_naught.ravel() * gamma
+    output = np.empty((len(s), n_days + 1, 3))
+    output[:, 0, 0] = s
+    output[:, 0, 1] = i
+    output[:, 0, 2] = r
+    for day in range(1, n_days + 1):
+        dsdt = -(beta*i*s)/N
+        didt = (beta*i*s)/N - gamma*i
+        drdt = gamma*i
+        s = dsdt + s
+        i = didt + i
+        r = drdt + r
+        output[:, day, 0] = s
+        output[:, day, 1] = i
+        output[:, day, 2] = r
+    return output
+
+
+def _parameter_derivatives(r_naught, d):
+    """Derivatives of beta and gamma with respect to r naught and d
+
+    Args:
+        r_naught (float): the r naught
+        d (float): the d (days of infection)
+
+    Returns:
+        np.ndarray, np.ndarray: d(beta) and d(gamma) with respect to (r_naught, d)
+    """
+    gamma = 1.0/d
+    dgamma = np.array([0.0, -1.0/d**2])
+    dbeta = np.array([gamma, r_naught*dgamma[1]])
+    return dbeta, dgamma
+
+
+def sir_sensitivity(s, i, r, r_naught, d, n_days):
+    """SIR Model that also propegates the derivatives of S,I,R with respect to r naught and d
+
+    These are the forward sensitivity equations of the same discrete steps as sir(),
+    so the trajectory is identical and the derivatives are exact, not finite differences.
+
+    Args:
+        s (int): initial susceptible population
+        i (int): initial infected population
+        r (int): initial recover population
+        r_naught (float): the r naught to use to propegate
+        d (float): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+
+    Returns:
+        np.ndarray, np.ndarray: S,I,R for each day with shape (n_days+1, 3), and their
+        derivatives with respect to (r_naught, d) with shape (n_days+1, 3, 2)
+    """
+    s, i, r, r_naught, d = [float(v) for v in (s, i, r, r_naught, d)]
+    N = s + i + r
+    gamma = 1.0/d
+    beta = r_naught * gamma
+    (dbeta_r, dbeta_d), (dgamma_r, dgamma_d) = [[float(v) for v in dv] for dv in _parameter_derivatives(r_naught, d)]
+    #stepped on plain floats, one per state and parameter, small arrays would cost more than the arithmetic
+    ds_r = ds_d = di_r = di_d = dr_r = dr_d = 0.0
+    output = [[s, i, r]]
+    sensitivity = [[0.0, 0.0, 0.0, 0.0, 0.0, 0.0]]
+    for day in range(n_days):
+        infections = (beta*i*s)/N
+        dinfections_r = (dbeta_r*i*s + beta*di_r*s + beta*i*ds_r)/N
+        dinfections_d = (dbeta_d*i*s + beta*di_d*s + beta*i*ds_d)/N
+        recoveries = gamma*i
+        drecoveries_r = dgamma_r*i + gamma*di_r
+        drecoveries_d = dgamma_d*i + gamma*di_d
+        s, ds_r, ds_d = -infections + s, ds_r - dinfections_r, ds_d - dinfections_d
+        i, di_r, di_d = (infections - recoveries) + i, di_r + dinfections_r - drecoveries_r, di_d + dinfections_d - drecoveries_d
+        r, dr_r, dr_d = recoveries + r, dr_r + drecoveries_r, dr_d + drecoveries_d
+        output.append([s, i, r])
+        sensitivity.append([ds_r, ds_d, di_r, di_d, dr_r, dr_d])
+    output, sensitivity = np.array(output, dtype=float), np.array(sensitivity).reshape(-1, 3, 2)
+    return output, sensitivity
+
+
+def sir_ode(s, i, r, r_naught, d, n_days, sensitivities: bool = False):
+    """Continuous time SIR Model solved with odeint
+
+    Args:
+        s (int): initial susceptible population
+        i (int): initial infected population
+        r (int): initial recover population
+        r_naught (float): the r naught to use to propegate
+        d (float): the d to use to propegate (days of infection)
+        n_days (int): number of days to propegate
+        sensitivities (bool, optional): also solve the sensitivity equations. Defaults to False.
+
+    Returns:
+        np.ndarray or np.ndarray, np.ndarray: S,I,R at each whole day with shape (n_days+1, 3),
+        and with sensitivities their derivatives with respect to (r_naught, d) with shape (n_days+1, 3, 2)
+    """
+    N = s + i + r
+    gamma = 1.0/d
+    beta = r_naught * gamma
+    dbeta, dgamma = _parameter_derivatives(r_naught, d)
+
+    def derivatives(y, t):
+        infections = beta*y[1]*y[0]/N
+        recoveries = gamma*y[1]
+        dydt = [-infections, infections - recoveries, recoveries]
+        if sensitivities:
+            ds, di = y[3:5], y[5:7]
+            dinfections = (dbeta*y[1]*y[0] + beta*di*y[0] + beta*y[1]*ds)/N
+            drecoveries = dgamma*y[1] + gamma*di
+            dydt = np.concatenate([dydt, -dinfections, dinfections - drecoveries, drecoveries])
+        return dydt
+
+    y0 = np.zeros(9 if sensitivities else 3)
+    y0[:3] = s, i, r
+    solution = scipy.integrate.odeint(derivatives, y0, np.arange(n_days + 1))
+    if sensitivities:
+        return solution[:, :3], solution[:, 3:].reshape(-1, 3, 2)
+    return solution
+
+
+#discrete is the original finite difference fit, jacobian adds the exact
+#derivatives of the discrete model and ode fits the continuous time model
+fit_backends = ['discrete', 'jacobian', 'ode']
+
+
+def sir_fit_functions(s, i, r, n_days: int, backend: str = 'discrete', d: float = None, daily: bool = False):
+    """Build the model and jacobian functions for curve_fit to fit the infected curve
+
+    Args:
+        s (int): initial susceptible population
+        i (int): initial infected population
+        r (int): initial recover population
+        n_days (int): number of days to propegate
+        backend (str, optional): one of fit_backends. Defaults to 'discrete'.
+        d (float, optional): fixed d, only r naught is fit when it is set. Defaults to None.
+        daily (bool, optional): fit the day to day change of I instead of I. Defaults to False.
+
+    Returns:
+        callable, callable, dict: the model, its jacobian (None for the discrete backend)
+        and a dict counting model and jacobian evaluations
+    """
+    if backend not in fit_backends:
+        raise ValueError('backend must be one of %s' % fit_backends)
+    counts = {'nfev': 0, 'njev': 0}
+    last = {}
+
+    def run(pars):
+        #curve_fit asks for the model and the jacobian at the same parameters, solve once for both
+        pars = tuple(float(p) for p in pars)
+        if last.get('pars') != pars:
+            r_naught, days = (pars[0], d) if d is not None else pars
+            if backend == 'jacobian':
+                trajectory, sensitivity = sir_sensitivity(s, i, r, r_naught, days, n_days)
+            else:
+                trajectory, sensitivity = sir_ode(s, i, r, r_naught, days, n_days, sensitivities=True)
+            infected, dinfected = trajectory[:, 1], sensitivity[:, 1, :1] if d is not None else sensitivity[:, 1, :]
+            if daily:
+                infected, dinfected = np.diff(infected), np.diff(dinfected, axis=0)
+            last.update({'pars': pars, 'infected': infected, 'dinfected': dinfected})
+        return last
+
+    def model(x, *pars):
+        counts['nfev'] += 1
+        if backend == 'discrete':
+            r_naught, days = (pars[0], d) if d is not None else pars
+            #one parameter set, plain floats in sir() beat stepping length one arrays
+            infected = np.array([v[1] for v in sir(float(s), float(i), float(r), r_naught, days, n_days)])
+            return np.diff(infected) if daily else infected
+        return run(pars)['infected']
+
+    def jacobian(x, *pars):
+        counts['njev'] += 1
+        return run(pars)['dinfected']
+
+    return model, (None if backend == 'discrete' else jacobian), counts
+
+
+@timed('fit_rnaught')
+def fit_rnaught(cases: pd.Series, population: int = 1250578, backend: str = 'discrete', full_output: bool = False, p0: float = 1.1, susceptible: float = None):
     """Fit R0 and optionally d
 
     Args:
         cases (pd.Series): the column called cases from NYTimes df
         population (int): the population of the county in question
+        backend (str, optional): one of fit_backends. Defaults to 'discrete'.
+        full_output (bool, optional): also return evaluation counts and timing. Defaults to False.
+        p0 (float, optional): starting r naught of the optimizer. Defaults to 1.1.
+        susceptible (float, optional): susceptible population on the first day, the rest of the population
+            not infected counts as recovered. Defaults to everyone not infected.
 
         Returns:
-        float, float: the r_naught and d, respectively 
+        float or float, dict: the r_naught, and with full_output a dict of backend, nfev, njev and seconds
 
     """
     #do something similar with population?
     i = cases.to_list()[0]
-    r = 0
-    s = population - i - r
-    def fit_function(x, r_naught):
-        return np.diff([v[1] for v in sir(s,i,r,r_naught,10,len(x))])
+    s = population - i if susceptible is None else susceptible
+    r = population - i - s
+    fit_function, jacobian, counts = sir_fit_functions(s, i, r, len(cases)-1, backend=backend, d=10, daily=True)
 
-    pars, _ = scipy.optimize.curve_fit(fit_function, np.arange(len(cases)-1), cases[1:].values, p0=[1.1], bounds=[[0.5],[15]])
+    start = time.perf_counter()
+    pars, _ = scipy.optimize.curve_fit(fit_function, np.arange(len(cases)-1), cases[1:].values, p0=[p0], bounds=[[0.5],[15]], jac=jacobian)
 
+    if full_output:
+        return pars[0], dict(counts, backend=backend, seconds=time.perf_counter() - start)
     return pars[0]
 
 
+#columns of the RollingRnaught tables
+rolling_columns = ['date', 'r_naught', 'susceptible', 'status', 'error', 'nfev', 'seconds']
+
+
+class RollingRnaught:
+    """R0 of every trailing window of a county's daily cases, updated day by day
+
+    Each time days are appended only the windows ending on the new days are fit.
+    Each fit starts the optimizer at the previous window's R0, which is usually
+    within a few percent, so it takes a handful of evaluations. With carry_state
+    the susceptible count is carried from window to window: the fitted model of
+    one window is stepped a day forward to give the susceptibles at the start of
+    the next, instead of resetting the whole population to susceptible every
+    window like fit_rnaught does. Only the last window of cases is kept in memory.
+    """
+    def __init__(self, window: int = 30, population: int = 1250578, backend: str = 'jacobian', carry_state: bool = True):
+        self.window = window
+        self.population = population
+        self.backend = backend
+        self.carry_state = carry_state
+        self.cases = collections.deque(maxlen=window)
+        self.last_label = None
+        self.susceptible = None #susceptibles on the first day of the next window
+        self.r_naught = None #last successful fit, the next fit starts from it
+        self.results = []
+
+    def _fit_window(self, label):
+        """Fit the current window and move the carried state one day forward
+
+        Args:
+            label: index label of the last day of the window
+
+        Returns:
+            dict: date, r_naught, susceptible, status, error, nfev and seconds of the window
+        """
+        cases = pd.Series(self.cases)
+        susceptible = self.susceptible if self.carry_state else None
+        p0 = 1.1 if self.r_naught is None else min(max(self.r_naught, 0.51), 14.99) #strictly inside the bounds of fit_rnaught
+        start = time.perf_counter()
+        try:
+            if cases[0] <= 0:
+                #no one infected on the first day, the model stays flat whatever the r naught
+                r_naught, status, error, nfev = np.nan, 'skipped', 'no cases on the first day of the window', 0
+            else:
+                r_naught, info = fit_rnaught(cases, self.population, self.backend, full_output=True, p0=p0, susceptible=susceptible)
+                status, error, nfev = 'ok', None, info['nfev']
+                self.r_naught = r_naught
+        except Exception as err:
+            r_naught, status, error, nfev = np.nan, 'failed', '%s: %s' % (type(err).__name__, err), None
+
+        s = self.population - cases[0] if susceptible is None else susceptible
+        if self.carry_state and self.r_naught is not None:
+            i = cases[0]
+            self.susceptible = sir_batch(s, i, self.population - s - i, self.r_naught, 10, 1)[0, 1, 0]
+        return {
+            'date': label,
+            'r_naught': r_naught,
+            'susceptible': s,
+            'status': status,
+            'error': error,
+            'nfev': nfev,
+            'seconds': time.perf_counter() - start
+        }
+
+    def update(self, cases: pd.Series) -> pd.DataFrame:
+        """Append new days and fit the windows ending on them
+
+        Days whose index label is not after the last day already seen are skipped,
+        so the county's full refreshed series can be passed as is.
+
+        Args:
+            cases (pd.Series): daily cases indexed by date (or any increasing label)
+
+        Returns:
+            pd.DataFrame: the fits of the new windows, see series
+        """
+        if self.last_label is not None:
+            cases = cases.loc[cases.index > self.last_label]
+        new_results = []
+        for label, count in cases.items():
+            self.cases.append(count)
+            self.last_label = label
+            if len(self.cases) == self.window:
+                new_results.append(self._fit_window(label))
+        self.results.extend(new_results)
+        return pd.DataFrame(new_results, columns=rolling_columns)
+
+    def series(self) -> pd.DataFrame:
+        """Every window fit so far
+
+        Returns:
+            pd.DataFrame: date (last day of the window), r_naught, susceptible on the window's first day,
+            status, error, nfev and seconds of each window
+        """
+        return pd.DataFrame(self.results, columns=rolling_columns)
+
+
+def _fit_county(job):
+    """Fit a single county for fit_all_counties, never raising
+
+    Args:
+        job (tuple): fips, county, state, cases and population of one county
+
+    Returns:
+        dict: the fit result, status and wall time of the county
+    """
+    fips, county, state, cases, population = job
+    start = time.perf_counter()
+    try:
+        if cases.iloc[0] <= 0:
+            #no one infected on the first day, the model stays flat and curve_fit would just return p0
+            r_naught, status, error = np.nan, 'skipped', 'no cases on the first day after from_date'
+        else:
+            r_naught = fit_rnaught(cases, population)
+            status, error = 'ok', None
+    except Exception as err:
+        #one county that does not converge should not stop the whole run
+        r_naught, status, error = np.nan, 'failed', '%s: %s' % (type(err).__name__, err)
+    return {
+        'fips': fips,
+        'county': county,
+        'state': state,
+        'r_naught': r_naught,
+        'status': status,
+        'error': error,
+        'seconds': time.perf_counter() - start
+    }
+
+
+@timed('fit_all_counties', rows=len)
+def fit_all_counties(df: pd.DataFrame, from_date: str, workers: int = None, populations: dict = None, population: int = 1250578):
+    """Fit R0 for every county in parallel across a process pool
+
+    Args:
+        df (pd.DataFrame): raw NYTimes data
+        from_date (str): first date to include
+        workers (int, optional): number of processes, 1 runs in this process. Defaults to the number of cores.
+        populations (dict, optional): population per fips, counties missing from it or without fips use population. Defaults to None.
+        population (int, optional): fallback population of a county. Defaults to 1250578.
+
+    Returns:
+        pd.DataFrame: fips, county, state, r_naught, status (ok, skipped or failed), error and seconds for each county
+    """
+    populations = {} if populations is None else populations
+    df = df.loc[pd.to_datetime(df['date']) >= pd.to_datetime(from_date), :]
+
+    jobs = []
+    #grouped on county_keys, not fips alone, which is empty for New York City and unknown counties
+    for (fips, state, county), county_df in df.groupby(county_keys, sort=False, dropna=False, observed=True):
+        fips = None if pd.isna(fips) else fips
+        jobs.append((
+            fips,
+            county,
+            state,
+            county_df['cases'].reset_index(drop=True),
+            populations.get(fips, population)
+        ))
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers == 1:
+        results = [_fit_county(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_fit_county, jobs, chunksize=max(1, len(jobs)//(4*workers))))
+
+    results = pd.DataFrame(results, columns=['fips', 'county', 'state', 'r_naught', 'status', 'error', 'seconds'])
+    return results.astype({'fips': nytimes_dtypes['fips']})
+
+
 #SCRIPT SECTION ==============================
 if __name__ == '__main__':
 
@@ -121,6 +508,11 @@ if __name__ == '__main__':
     #Libraries are collections of functions
     #Script is specific code to be executed
     df = read('data\\us_counties.csv')
-    allegheny = subset_county(df, 'allegheny', 'pennsylvania', '2021-12-26')
+    index = CountyIndex(df)
+    allegheny = subset_county(df, 'allegheny', 'pennsylvania', '2021-12-26', index=index)
     print(allegheny)
     print(fit_rnaught(allegheny['cases']))
+    rolling = RollingRnaught(window=30)
+    rolling.update(index.county('allegheny', 'pennsylvania').set_index('date')['cases'])
+    print(rolling.series())
+    print(fit_all_counties(df, '2021-12-26'))
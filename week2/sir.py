@@ -1,9 +1,15 @@
 #csv: comma separated variables
+import time
 import pandas as pd
 import matplotlib.pyplot as plt
 import scipy.optimize
 from typing import Iterable
 
+from instrumentation import timed
+from week2.nytimes import daily_cases, load_us_counties
+from week2.project import sir_fit_functions
+
+@timed('read', rows=len)
 def read(path:str) -> pd.DataFrame:
     """Read in csv file NYT data
 
@@ -13,11 +19,9 @@ def read(path:str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Data frame for processing
     """
-    df = pd.read_csv(path)
-    df = df.loc[df['county'] == 'Allegheny']
-    df = df.loc[df['state'] == 'Pennsylvania']
-    df['cases'] = df['cases'].diff()
-    df['cases'] = df['cases'].fillna(0)
+    df = daily_cases(load_us_counties(path))
+    df = df.loc[df['county'] == 'allegheny']
+    df = df.loc[df['state'] == 'pennsylvania']
     return df
 
 def calc_recovered(df, pop_county = 1_250_000):
@@ -51,7 +55,8 @@ def sir(s, i, r, r_naught, d, n_days):
     return output
 
 
-def fit_sir(cases: pd.Series):
+@timed('fit_sir')
+def fit_sir(cases: pd.Series, backend: str = 'discrete', full_output: bool = False):
     cases = cases.values
     n = 1_250_578
     i = cases[0]
@@ -59,10 +64,12 @@ def fit_sir(cases: pd.Series):
     r = 0
     n_days = len(cases) - 1
 
-    def fit_function(days, r0, d):
-        return [v[1] for v in sir(s, i, r, r0, d, n_days)]
+    fit_function, jacobian, counts = sir_fit_functions(s, i, r, n_days, backend=backend)
 
-    best, _ = scipy.optimize.curve_fit(fit_function, range(n_days), cases, p0=[2, 10], bounds=[(0.5, 4), (5, 10)])
+    start = time.perf_counter()
+    best, _ = scipy.optimize.curve_fit(fit_function, range(n_days), cases, p0=[2, 10], bounds=[(0.5, 4), (5, 10)], jac=jacobian)
+    if full_output:
+        return best, dict(counts, backend=backend, seconds=time.perf_counter() - start)
     return best
 
     
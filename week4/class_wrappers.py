@@ -2,14 +2,84 @@
 #Classes group together variable and operations on those variables
 #Keep classes relatively small
 #Keep them operating on linked ideas
+import copy
+import io
+import json
 import os.path
+import pickle
+import struct
+import time
 import numpy as np
+import pandas as pd
 import sklearn.metrics
 import sklearn.tree
 import xgboost as xgb
 import yaml
+from instrumentation import timed
 
 
+#single file model format: magic, format version and metadata length, json metadata, then the model bytes
+#version 2 stores decision trees as plain arrays, version 1 pickled them
+artifact_magic = b'CWRP'
+artifact_version = 2
+_artifact_header = struct.Struct('<4sII')
+
+#models already loaded in this process, keyed by path, mtime and size
+_loaded_models = {}
+
+
+def _tree_to_bytes(model: sklearn.tree.DecisionTreeClassifier):
+    """Store a fitted decision tree as arrays, without pickle
+
+    Args:
+        model (sklearn.tree.DecisionTreeClassifier): fitted single output tree
+
+    Returns:
+        bytes, dict: npz archive of the node arrays and classes, and the scalars needed to rebuild the tree
+    """
+    if model.n_outputs_ != 1:
+        raise ValueError('only single output decision trees can be saved')
+    state = model.tree_.__getstate__()
+    arrays = {'nodes': state['nodes'], 'values': state['values'], 'classes': np.asarray(model.classes_.tolist())}
+    if hasattr(model, 'feature_names_in_'):
+        arrays['feature_names'] = np.asarray(model.feature_names_in_.tolist())
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    info = {
+        'max_depth': int(state['max_depth']),
+        'node_count': int(state['node_count']),
+        'n_features_in': int(model.n_features_in_),
+        'max_features': int(model.max_features_),
+        'sklearn_version': sklearn.__version__
+    }
+    return buffer.getvalue(), info
+
+
+def _tree_from_bytes(model_bytes: bytes, info: dict, model_params: dict):
+    """Rebuild a decision tree stored by _tree_to_bytes, no code in the file is run
+
+    Args:
+        model_bytes (bytes): the npz archive
+        info (dict): the scalars stored next to it
+        model_params (dict): parameters the tree was trained with
+
+    Returns:
+        sklearn.tree.DecisionTreeClassifier: the fitted tree
+    """
+    with np.load(io.BytesIO(model_bytes), allow_pickle=False) as arrays:
+        arrays = dict(arrays)
+    model = sklearn.tree.DecisionTreeClassifier(**model_params)
+    model.classes_ = arrays['classes']
+    model.n_classes_ = len(model.classes_)
+    model.n_outputs_ = 1
+    model.n_features_in_ = info['n_features_in']
+    model.max_features_ = info['max_features']
+    if 'feature_names' in arrays:
+        model.feature_names_in_ = arrays['feature_names'].astype(object)
+    model.tree_ = sklearn.tree._tree.Tree(info['n_features_in'], np.array([model.n_classes_], dtype=np.intp), 1)
+    model.tree_.__setstate__({'max_depth': info['max_depth'], 'node_count': info['node_count'], 'nodes': arrays['nodes'], 'values': arrays['values']})
+    return model
+
 
 class ClassifierWrapper:
     def __init__(self):
@@ -18,49 +88,202 @@ class ClassifierWrapper:
         self.mins_maxes = None
         self.pars = {
             'n_training_points': 0,
-            'model_type': 'xgboost'
+            'model_type': 'xgboost',
+            'model_params': {}
         }
+        self.throughput = None #rows per second of the last apply_iter
+
+    @timed('ClassifierWrapper.train')
+    def train(self, x_data: np.ndarray, labels: np.ndarray, decision_tree: bool = False, eval_data: tuple = None, **model_params):
+        """Train a new model
 
-    def train(self, x_data: np.ndarray, labels: np.ndarray, decision_tree: bool = False):
+        Args:
+            x_data (np.ndarray): features
+            labels (np.ndarray): labels
+            decision_tree (bool, optional): train a decision tree instead of xgboost. Defaults to False.
+            eval_data (tuple, optional): (features, labels) watched by xgboost, needed for early_stopping_rounds. Defaults to None.
+            **model_params: passed on to the model, e.g. tree_method='hist', max_depth, n_jobs
+        """
         self.pars['n_training_points'] = len(labels)
+        self.pars['model_params'] = model_params
         if decision_tree:
             self.pars['model_type'] = 'decision tree'
-            self.model = sklearn.DecisionTreeClassifier()
+            self.model = sklearn.tree.DecisionTreeClassifier(**model_params)
+            self.model.fit(x_data, labels)
         else:
-            self.model = xgb.XGBClassifier()
-        self.model.fit(x_data, labels)
+            self.model = xgb.XGBClassifier(**model_params)
+            if eval_data is None:
+                self.model.fit(x_data, labels)
+            else:
+                self.model.fit(x_data, labels, eval_set=[eval_data], verbose=False)
 
+    @timed('ClassifierWrapper.apply', rows=len)
     def apply(self, x_data: np.ndarray):
        return self.model.predict_proba(x_data)
 
-    def assess(self, x_data: np.ndarray, labels: np.ndarray, assesment: str):
-        binary_pred = self.model.predict(x_data)
-        if assesment == 'percent_correct':
-            correct_points = 1 - np.abs(binary_pred.astype(int) - labels.astype(int))
-            percent_correct = correct_points.sum()/len(correct_points)
-            return percent_correct
-        else:
-            return sklearn.metrics.confusion_matrix(labels, binary_pred)
-            # TP = cm[0][0]
-            # FP = cm[0][1]
-            # FN = cm[1][0]
-            # TN = cm[1][1]       
+    def apply_iter(self, source, chunk_size: int = 65536, n_threads: int = None, **read_args):
+        """Score data too large for memory chunk by chunk
+
+        Every chunk's probabilities are copied into one preallocated buffer that is
+        reused for the next chunk, so copy what you yield if you keep it. Rows per
+        second of model time are stored in self.throughput.
+
+        Args:
+            source (str or iterable): csv path read with pd.read_csv(chunksize=chunk_size), or an iterable of arrays or DataFrames
+            chunk_size (int, optional): rows scored at a time. Defaults to 65536.
+            n_threads (int, optional): threads the model predicts with, self.model is left as it is. Defaults to the model's setting.
+            **read_args: passed on to pd.read_csv
+
+        Yields:
+            np.ndarray: class probabilities of the rows of each chunk
+        """
+        model = self.model
+        if n_threads is not None and 'n_jobs' in model.get_params() and model.get_params()['n_jobs'] != n_threads:
+            #loaded models are shared between wrappers, set the threads on a private copy
+            model = copy.deepcopy(model)
+            model.set_params(n_jobs=n_threads)
+        chunks = pd.read_csv(source, chunksize=chunk_size, **read_args) if isinstance(source, str) else source
+
+        buffer = None
+        rows, seconds = 0, 0.0
+        for chunk in chunks:
+            x_chunk = chunk.values if isinstance(chunk, pd.DataFrame) else np.asarray(chunk)
+            for start in range(0, len(x_chunk), chunk_size):
+                x_data = x_chunk[start:start + chunk_size]
+                started = time.perf_counter()
+                proba = model.predict_proba(x_data)
+                seconds += time.perf_counter() - started
+                if buffer is None:
+                    buffer = np.empty((chunk_size, proba.shape[1]), dtype=proba.dtype)
+                out = buffer[:len(proba)]
+                np.copyto(out, proba)
+                rows += len(proba)
+                self.throughput = rows/seconds if seconds > 0 else None
+                yield out
+
+    @timed('ClassifierWrapper.assess')
+    def assess(self, x_data: np.ndarray, labels: np.ndarray, assesment = 'percent_correct'):
+        """Assess the model on labelled data with a single inference pass
+
+        Args:
+            x_data (np.ndarray): features
+            labels (np.ndarray): true labels
+            assesment (str or list[str]): 'percent_correct', 'confusion_matrix', or a list of both
+
+        Returns:
+            the assesment, or a dict of every assesment when given a list
+        """
+        proba = self.apply(x_data)
+        binary_pred = self.model.classes_[np.argmax(proba, axis=1)]
+
+        def single(assesment):
+            if assesment == 'percent_correct':
+                correct_points = 1 - np.abs(binary_pred.astype(int) - labels.astype(int))
+                percent_correct = correct_points.sum()/len(correct_points)
+                return percent_correct
+            else:
+                return sklearn.metrics.confusion_matrix(labels, binary_pred)
+                # TP = cm[0][0]
+                # FP = cm[0][1]
+                # FN = cm[1][0]
+                # TN = cm[1][1]       
+
+        if isinstance(assesment, str):
+            return single(assesment)
+        return {name: single(name) for name in assesment}
         
 
     def save(self, path:str):
-        if self.pars['model_type'] != 'xgboost':
-            raise NotImplementedError('We can only save xgboost classifiers')
+        """Save the model and its pars to a single versioned file
 
-        base, ext = os.path.splitext(path)
-        self.model.save_model(base + '.xgb')
-        with open(base + '.yaml', 'w') as fo:
-            yaml.dump(self.pars, fo)       
+        xgboost models are stored as a binary UBJSON booster, decision trees as an npz
+        archive of their node arrays. Neither runs code when it is loaded.
+
+        Args:
+            path (str): location of the file
+        """
+        extra = {}
+        if self.pars['model_type'] == 'xgboost':
+            model_format, model_bytes = 'ubj', bytes(self.model.get_booster().save_raw('ubj'))
+        else:
+            model_format = 'tree_npz'
+            model_bytes, extra['tree'] = _tree_to_bytes(self.model)
+
+        metadata = json.dumps(dict(extra, pars=self.pars, model_format=model_format)).encode()
+        with open(path, 'wb') as fo:
+            fo.write(_artifact_header.pack(artifact_magic, artifact_version, len(metadata)))
+            fo.write(metadata)
+            fo.write(model_bytes)
+
+    def load(self, path: str, use_cache: bool = True, allow_pickle: bool = False):
+        """Load a model saved with save into this wrapper
+
+        Loaded models are kept for the life of the process, so loading the same
+        unchanged file again costs nothing. The cached model is shared, it should
+        only be used for inference. Files from the older .xgb and .yaml pair are
+        still read. Decision trees saved by version 1 of the format are pickled,
+        and unpickling runs whatever code the file holds, so they are only read
+        with allow_pickle, for files you trust. Save them again to convert them.
+
+        Args:
+            path (str): location of the file
+            use_cache (bool, optional): reuse a model already loaded from this file. Defaults to True.
+            allow_pickle (bool, optional): read pickled version 1 decision trees. Defaults to False.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if not use_cache or key not in _loaded_models:
+            _loaded_models[key] = self._read(path, allow_pickle)
+        self.model, pars = _loaded_models[key]
+        self.pars = dict(pars)
+
+    @classmethod
+    def from_file(cls, path: str, use_cache: bool = True, allow_pickle: bool = False):
+        """Create a wrapper from a saved model, see load
+
+        Args:
+            path (str): location of the file
+            use_cache (bool, optional): reuse a model already loaded from this file. Defaults to True.
+            allow_pickle (bool, optional): read pickled version 1 decision trees. Defaults to False.
+
+        Returns:
+            ClassifierWrapper: the wrapper holding the loaded model
+        """
+        cw = cls()
+        cw.load(path, use_cache, allow_pickle)
+        return cw
+
+    @staticmethod
+    def _read(path: str, allow_pickle: bool = False):
+        with open(path, 'rb') as fo:
+            header = fo.read(_artifact_header.size)
+            if len(header) < _artifact_header.size or header[:4] != artifact_magic:
+                return ClassifierWrapper._read_legacy(path)
+            magic, version, metadata_length = _artifact_header.unpack(header)
+            if version > artifact_version:
+                raise ValueError('%s has model format version %d, this code reads up to %d' % (path, version, artifact_version))
+            metadata = json.loads(fo.read(metadata_length))
+            model_bytes = fo.read()
+
+        if metadata['model_format'] == 'ubj':
+            model = xgb.XGBClassifier()
+            model.load_model(bytearray(model_bytes))
+        elif metadata['model_format'] == 'tree_npz':
+            model = _tree_from_bytes(model_bytes, metadata['tree'], metadata['pars']['model_params'])
+        elif allow_pickle:
+            model = pickle.loads(model_bytes)
+        else:
+            raise ValueError('%s holds a pickled model, which runs code when loaded, pass allow_pickle=True only if you trust the file' % path)
+        return model, metadata['pars']
 
-    def load(self, path: str):
+    @staticmethod
+    def _read_legacy(path: str):
         base, ext = os.path.splitext(path)
-        self.model.load_model(base + '.xgb')
+        model = xgb.XGBClassifier()
+        model.load_model(base + '.xgb')
         with open(base + '.yaml', 'r') as fo:
-            self.pars = yaml.load(fo.read())
+            pars = yaml.safe_load(fo.read())
+        return model, pars
 
     if __name__ == '__main__':
         cw = ClassifierWrapper()
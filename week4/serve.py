@@ -0,0 +1,263 @@
+#Local scoring server around a saved ClassifierWrapper
+#Concurrent requests are gathered into micro batches, so the model is called once per batch instead of once per request.
+#    python -m week4.serve data\wine_model.xgb --port 8000 --max-batch 256 --max-wait-ms 2
+#    python -m week4.serve --load-test http://127.0.0.1:8000 --concurrency 32
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import queue
+import threading
+import time
+import numpy as np
+import requests
+
+from week4.class_wrappers import ClassifierWrapper
+
+
+class MicroBatcher:
+    """Score rows from many threads in shared batches on one worker thread
+
+    The worker takes the first waiting request, then keeps collecting requests
+    until max_batch rows are gathered or max_wait seconds have passed since the
+    first, and calls the model once for all of them. Latency is measured from
+    submit to result, the last latency_window of them are kept for percentiles.
+    """
+    def __init__(self, model: ClassifierWrapper, max_batch: int = 256, max_wait: float = 0.002, latency_window: int = 10000):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.n_features = getattr(model.model, 'n_features_in_', None)
+        self.requests = queue.Queue()
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.counters = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.worker.start()
+
+    def submit(self, features) -> concurrent.futures.Future:
+        """Queue rows for scoring
+
+        Args:
+            features (array-like): one row, or a 2d array of rows
+
+        Returns:
+            concurrent.futures.Future: resolves to the probabilities of the rows, shape (n_rows, n_classes)
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+        if features.ndim != 2 or (self.n_features is not None and features.shape[1] != self.n_features):
+            raise ValueError('expected rows of %s features, got shape %s' % (self.n_features, features.shape))
+        future = concurrent.futures.Future()
+        self.requests.put((features, future, time.perf_counter()))
+        return future
+
+    def predict(self, features, timeout: float = None) -> np.ndarray:
+        """Score rows and wait for the result, see submit"""
+        return self.submit(features).result(timeout)
+
+    def _collect(self):
+        """Wait for a request and gather more until the batch is full or max_wait has passed
+
+        Returns:
+            list[tuple]: the requests of the batch, None once close was called
+        """
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        rows = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pending is None:
+                self.requests.put(None) #stop after this batch
+                break
+            batch.append(pending)
+            rows += len(pending[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                proba = self.model.apply(np.concatenate([features for features, future, submitted in batch]))
+            except Exception as err:
+                for features, future, submitted in batch:
+                    future.set_exception(err)
+                with self.lock:
+                    self.counters['errors'] += len(batch)
+                continue
+
+            done = time.perf_counter()
+            start = 0
+            for features, future, submitted in batch:
+                future.set_result(proba[start:start + len(features)])
+                start += len(features)
+            with self.lock:
+                self.counters['requests'] += len(batch)
+                self.counters['rows'] += start
+                self.counters['batches'] += 1
+                self.latencies.extend(done - submitted for features, future, submitted in batch)
+
+    def stats(self) -> dict:
+        """Counters, latency percentiles and throughput since the batcher started
+
+        Returns:
+            dict: requests, rows, batches, errors, mean_batch_rows, p50_ms, p99_ms, requests_per_sec and rows_per_sec
+        """
+        with self.lock:
+            out = dict(self.counters)
+            latencies = np.array(self.latencies)
+        elapsed = time.perf_counter() - self.started
+        out['mean_batch_rows'] = out['rows']/out['batches'] if out['batches'] else None
+        out['p50_ms'] = float(np.percentile(latencies, 50)*1000) if len(latencies) else None
+        out['p99_ms'] = float(np.percentile(latencies, 99)*1000) if len(latencies) else None
+        out['requests_per_sec'] = out['requests']/elapsed
+        out['rows_per_sec'] = out['rows']/elapsed
+        out['max_batch'] = self.max_batch
+        out['max_wait_ms'] = self.max_wait*1000
+        return out
+
+    def close(self):
+        """Finish the queued requests and stop the worker"""
+        self.requests.put(None)
+        self.worker.join()
+
+
+class ScoringHandler(http.server.BaseHTTPRequestHandler):
+    """POST /predict with {"features": row or rows}, GET /stats"""
+    protocol_version = 'HTTP/1.1' #keep connections open between requests
+    disable_nagle_algorithm = True #headers and body are separate writes, Nagle would hold the body for the delayed ACK
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.batcher.stats())
+        else:
+            self._reply(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._reply(404, {'error': 'unknown path %s' % self.path})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            future = self.server.batcher.submit(body['features'])
+        except (ValueError, KeyError, TypeError) as err:
+            self._reply(400, {'error': '%s: %s' % (type(err).__name__, err)})
+            return
+        try:
+            self._reply(200, {'probabilities': future.result().tolist()})
+        except Exception as err:
+            self._reply(500, {'error': '%s: %s' % (type(err).__name__, err)})
+
+    def log_message(self, format, *args):
+        pass #one line per request would cost more than the prediction
+
+
+class ScoringServer(http.server.ThreadingHTTPServer):
+    """HTTP server whose request threads share one MicroBatcher"""
+    daemon_threads = True
+
+    def __init__(self, address: tuple, batcher: MicroBatcher):
+        super().__init__(address, ScoringHandler)
+        self.batcher = batcher
+
+
+def serve(model_path: str, host: str = '127.0.0.1', port: int = 8000, max_batch: int = 256, max_wait: float = 0.002):
+    """Load a saved model once and serve it until interrupted
+
+    Args:
+        model_path (str): model saved with ClassifierWrapper.save
+        host (str, optional): address to listen on. Defaults to '127.0.0.1'.
+        port (int, optional): port to listen on. Defaults to 8000.
+        max_batch (int, optional): most rows scored in one call. Defaults to 256.
+        max_wait (float, optional): seconds a request waits for others to join its batch. Defaults to 0.002.
+    """
+    batcher = MicroBatcher(ClassifierWrapper.from_file(model_path), max_batch, max_wait)
+    server = ScoringServer((host, port), batcher)
+    print('serving %s on http://%s:%d' % (model_path, host, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+def load_test(url: str, n_requests: int = 5000, concurrency: int = 32, rows_per_request: int = 1, n_features: int = 11, seed: int = 0) -> dict:
+    """Send many concurrent prediction requests and measure them from the client
+
+    Args:
+        url (str): base url of the server, e.g. http://127.0.0.1:8000
+        n_requests (int, optional): requests to send in total. Defaults to 5000.
+        concurrency (int, optional): clients sending at the same time, each on its own connection. Defaults to 32.
+        rows_per_request (int, optional): rows in each request. Defaults to 1.
+        n_features (int, optional): features per row. Defaults to 11, the wine data.
+        seed (int, optional): seed of the random rows. Defaults to 0.
+
+    Returns:
+        dict: client side requests, errors, p50_ms, p99_ms and requests_per_sec, and the server's stats afterwards
+    """
+    rows = np.random.default_rng(seed).normal(size=(n_requests, rows_per_request, n_features)).tolist()
+
+    def client(worker: int):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            for k in range(worker, n_requests, concurrency):
+                tic = time.perf_counter()
+                response = session.post(url + '/predict', json={'features': rows[k]})
+                latencies.append(time.perf_counter() - tic)
+                errors += response.status_code != 200
+        return latencies, errors
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.concatenate([result[0] for result in results])
+    return {
+        'requests': n_requests,
+        'errors': sum(result[1] for result in results),
+        'p50_ms': float(np.percentile(latencies, 50)*1000),
+        'p99_ms': float(np.percentile(latencies, 99)*1000),
+        'requests_per_sec': n_requests/elapsed,
+        'server': requests.get(url + '/stats').json()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a saved ClassifierWrapper over HTTP, or load test a running server')
+    parser.add_argument('model_path', nargs='?', default='data\\wine_model.xgb', help='model saved with ClassifierWrapper.save')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256, help='most rows scored in one model call')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='milliseconds a request waits for others to join its batch')
+    parser.add_argument('--load-test', metavar='URL', help='load test the server at URL instead of serving')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.load_test:
+        print(json.dumps(load_test(args.load_test, args.requests, args.concurrency), indent=2))
+    else:
+        serve(args.model_path, args.host, args.port, args.max_batch, args.max_wait_ms/1000)
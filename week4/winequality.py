@@ -1,25 +1,132 @@
+import concurrent.futures
+import os
+import time
 import pandas as pd
 import numpy as np
 import sklearn.model_selection 
 import week4.class_wrappers
 
 
+default_grid = {
+    'tree_method': ['hist'],
+    'max_depth': [3, 6, 9],
+    'learning_rate': [0.05, 0.1, 0.3],
+    'subsample': [0.8, 1.0],
+    'n_estimators': [500]
+}
+
+#set once per worker process so the data is not sent with every task
+_features = None
+_labels = None
+
+
+def _init_worker(features: np.ndarray, labels: np.ndarray):
+    global _features, _labels
+    _features, _labels = features, labels
+
+
+def _fit_fold(task):
+    """Train and score one parameter set on one cross-validation fold
+
+    Args:
+        task (tuple): candidate number, model parameters, fold number, train indexes, test indexes, early stopping rounds
+
+    Returns:
+        dict: accuracy, fit time and prediction throughput of the fold
+    """
+    candidate, params, fold, train_index, test_index, early_stopping_rounds = task
+    train_index, valid_index = sklearn.model_selection.train_test_split(train_index, test_size=0.15, random_state=fold, stratify=_labels[train_index])
+
+    cw = week4.class_wrappers.ClassifierWrapper()
+    start = time.perf_counter()
+    cw.train(_features[train_index], _labels[train_index], eval_data=(_features[valid_index], _labels[valid_index]), early_stopping_rounds=early_stopping_rounds, **params)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accuracy = cw.assess(_features[test_index], _labels[test_index], 'percent_correct')
+    predict_seconds = time.perf_counter() - start
+    return {
+        'candidate': candidate,
+        'fold': fold,
+        'accuracy': accuracy,
+        'fit_seconds': fit_seconds,
+        'rows_per_sec': len(test_index)/predict_seconds,
+        #without early stopping every tree is kept, the last round is the best
+        'best_iteration': cw.model.best_iteration if early_stopping_rounds else cw.model.get_booster().num_boosted_rounds() - 1
+    }
+
+
+def tune(features: np.ndarray, labels: np.ndarray, param_grid: dict = None, n_iter: int = None, n_splits: int = 5, workers: int = None, early_stopping_rounds: int = 20, random_state: int = 0):
+    """Cross validate xgboost parameter sets in parallel and rank them
+
+    Every (parameter set, fold) pair is a task on a process pool, each model uses a
+    single thread so the pool is what spreads the work over the cores. Part of each
+    training fold is held out for early stopping.
+
+    Args:
+        features (np.ndarray): features
+        labels (np.ndarray): labels
+        param_grid (dict, optional): lists of values of each xgboost parameter. Defaults to default_grid.
+        n_iter (int, optional): try this many random parameter sets instead of the full grid. Defaults to None.
+        n_splits (int, optional): number of cross validation folds. Defaults to 5.
+        workers (int, optional): number of processes. Defaults to the number of cores.
+        early_stopping_rounds (int, optional): rounds without improvement before training stops, None trains every tree. Defaults to 20.
+        random_state (int, optional): seed of the folds and the random search. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: one row per parameter set, best mean accuracy first, with accuracy spread, fit time and throughput
+    """
+    param_grid = default_grid if param_grid is None else param_grid
+    if n_iter is None:
+        candidates = list(sklearn.model_selection.ParameterGrid(param_grid))
+    else:
+        candidates = list(sklearn.model_selection.ParameterSampler(param_grid, n_iter, random_state=random_state))
+    folds = sklearn.model_selection.StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(features, labels)
+    folds = list(folds)
+
+    tasks = [
+        (candidate, dict(params, n_jobs=1), fold, train_index, test_index, early_stopping_rounds)
+        for candidate, params in enumerate(candidates)
+        for fold, (train_index, test_index) in enumerate(folds)
+    ]
+    workers = os.cpu_count() if workers is None else workers
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features, labels)) as executor:
+        results = pd.DataFrame(executor.map(_fit_fold, tasks))
+
+    ranked = results.groupby('candidate').agg(
+        mean_accuracy=('accuracy', 'mean'),
+        std_accuracy=('accuracy', 'std'),
+        mean_fit_seconds=('fit_seconds', 'mean'),
+        rows_per_sec=('rows_per_sec', 'mean'),
+        mean_best_iteration=('best_iteration', 'mean')
+    )
+    ranked.insert(0, 'params', [candidates[candidate] for candidate in ranked.index])
+    ranked = ranked.sort_values(['mean_accuracy', 'mean_fit_seconds'], ascending=[False, True]).reset_index(drop=True)
+    ranked.insert(0, 'rank', np.arange(1, len(ranked) + 1))
+    return ranked
+
+
 if __name__ == '__main__':
     path = 'data\\winequality-white.csv'
     df = pd.read_csv(path, delimiter = ';')
     df['good'] = df['quality'] > 5
     
 
-features = df.drop(columns = ['good', 'quality']).values
-labels = df['good'].values
+    features = df.drop(columns = ['good', 'quality']).values
+    labels = df['good'].values
+
+    results = tune(features, labels)
+    print(results)
 
-train_features, test_features, train_labels, test_labels =\
-    sklearn.model_selection.train_test_split(features, labels, test_size=0.3)
+    train_features, test_features, train_labels, test_labels =\
+        sklearn.model_selection.train_test_split(features, labels, test_size=0.3)
 
-cw = week4.class_wrappers.ClassifierWrapper()
-cw.train(train_features, train_labels)
-print(cw.assess(test_features, test_labels, 'percent_correct'))
-cw.save('data\\wine_model.xgb')
+    #refit the best parameters with the number of trees early stopping settled on
+    best = dict(results['params'].iloc[0], n_estimators=int(results['mean_best_iteration'].iloc[0]) + 1)
+    cw = week4.class_wrappers.ClassifierWrapper()
+    cw.train(train_features, train_labels, **best)
+    print(cw.assess(test_features, test_labels, 'percent_correct'))
+    cw.save('data\\wine_model.xgb')
 #test_preds = test_preds[:,1]>=0.5
 #test_labels = test['good'].values
 
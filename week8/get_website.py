@@ -5,26 +5,271 @@ from typing import List
 from googlesearch import search
 import requests
 import re
+import tempfile
+import concurrent.futures
+import hashlib
+import html.parser
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import Counter
 import numpy as np
+import scipy.sparse
 
-from tenacity import retry_unless_exception_type
+from tenacity import retry, retry_if_exception, retry_unless_exception_type, stop_after_attempt, wait_exponential
+from feather_cache import cache_stamp, file_stamp, read_cache, write_cache
+from instrumentation import timed
 
 
-def scrape_website(path: str):
-    """Return the string of the data from a website given a path
+class HostRateLimiter:
+    """Space out requests to the same host across threads
+
+    Each host gets its own slot, so requests to different universities run
+    concurrently while a single host never sees more than one request per interval.
+    """
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host: str):
+        """Block until the host may be requested again
+
+        Args:
+            host (str): host name, or any key to rate limit on
+        """
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_allowed.get(host, now))
+            self.next_allowed[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def make_session(pool_size: int = 16):
+    """Create a requests session that keeps connections open between requests
 
     Args:
-        path (str): 
-    
-    Return:
+        pool_size (int, optional): connections kept per host. Defaults to 16.
 
+    Return: requests.Session
     """
-    #website = urllib.request.urlopen(path)
-    website = requests.get(path)
-    contents = website.text
-    website.close()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _is_transient(err: BaseException):
+    """Whether a failed request is worth retrying
+
+    Args:
+        err (BaseException): the error raised by the request
+
+    Return: bool
+    """
+    if isinstance(err, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code == 429 or err.response.status_code >= 500
+    return False
+
+@retry(retry=retry_if_exception(_is_transient), stop=stop_after_attempt(4), wait=wait_exponential(multiplier=1, max=30), reraise=True)
+def request_page(path: str, session: requests.Session = None, timeout: float = 10, limiter: HostRateLimiter = None, headers: dict = None):
+    """Send a GET, retrying connection errors, timeouts and 429/5xx responses with backoff
+
+    Args:
+        path (str): url of the page
+        session (requests.Session, optional): session to reuse connections from. Defaults to a one-off request.
+        timeout (float, optional): seconds to wait for the server. Defaults to 10.
+        limiter (HostRateLimiter, optional): per-host rate limit. Defaults to None.
+        headers (dict, optional): extra request headers. Defaults to None.
+
+    Return: requests.Response: the closed response, 304 Not Modified is not an error
+    """
+    if limiter is not None:
+        limiter.wait(urllib.parse.urlsplit(path).netloc)
+    website = (session or requests).get(path, timeout=timeout, headers=headers)
+    try:
+        website.raise_for_status()
+        website.text #read the body before the connection goes back to the pool
+        return website
+    finally:
+        website.close()
+
+def fetch_page(path: str, session: requests.Session = None, timeout: float = 10, limiter: HostRateLimiter = None):
+    """Download a page, retrying transient failures like request_page
+
+    Args:
+        path (str): url of the page
+        session (requests.Session, optional): session to reuse connections from. Defaults to a one-off request.
+        timeout (float, optional): seconds to wait for the server. Defaults to 10.
+        limiter (HostRateLimiter, optional): per-host rate limit. Defaults to None.
+
+    Return: str: the body of the page
+    """
+    return request_page(path, session, timeout, limiter).text
+
+class ResponseCache:
+    """On-disk cache of page bodies keyed by url
+
+    Entries younger than ttl seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since and only
+    downloaded again if the server says they changed. When the bodies grow past
+    max_bytes the least recently used entries are evicted.
+    """
+    def __init__(self, directory: str, ttl: float = 24*60*60, max_bytes: int = 512*1024*1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.body'))
+
+    def _paths(self, url: str):
+        key = os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+        return key + '.body', key + '.json'
+
+    def _count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _read(self, url: str):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r') as fo:
+                meta = json.load(fo)
+            with open(body_path, 'r', encoding='utf-8') as fo:
+                return meta, fo.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _replace(self, path: str, data: bytes):
+        """Atomically replace a file, through a temp file of this writer's own
+
+        The replaced size is read under the lock together with the replace, so
+        concurrent writers of one url each see the file they actually replaced.
+
+        Return: int: size of the file that was replaced, 0 if there was none
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fo:
+            fo.write(data)
+        with self.lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        return previous
+
+    def _write_meta(self, meta_path: str, meta: dict):
+        self._replace(meta_path, json.dumps(meta).encode())
+
+    def _store(self, url: str, website: requests.Response):
+        body_path, meta_path = self._paths(url)
+        body = website.text.encode('utf-8')
+        previous = self._replace(body_path, body)
+        with self.lock:
+            self.total_bytes += len(body) - previous
+            over_budget = self.total_bytes > self.max_bytes
+        self._write_meta(meta_path, {
+            'url': url,
+            'etag': website.headers.get('ETag'),
+            'last_modified': website.headers.get('Last-Modified'),
+            'fetched': time.time()
+        })
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the bodies fit in max_bytes"""
+        with self.lock:
+            entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                body_path = entry.path[:-len('.json')] + '.body'
+                try:
+                    size = os.path.getsize(body_path)
+                    os.remove(body_path)
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self.total_bytes -= size
+
+    def fetch(self, path: str, session: requests.Session = None, timeout: float = 10, limiter: HostRateLimiter = None):
+        """Return the body of a page from the cache, revalidating or downloading it when needed
+
+        Args:
+            path (str): url of the page
+            session (requests.Session, optional): session to reuse connections from. Defaults to a one-off request.
+            timeout (float, optional): seconds to wait for the server. Defaults to 10.
+            limiter (HostRateLimiter, optional): per-host rate limit. Defaults to None.
+
+        Return: str: the body of the page
+        """
+        meta, body = self._read(path)
+        body_path, meta_path = self._paths(path)
+        if meta is None:
+            self._count('misses')
+            website = request_page(path, session, timeout, limiter)
+            self._store(path, website)
+            return website.text
+
+        if time.time() - meta['fetched'] < self.ttl:
+            self._count('hits')
+            os.utime(meta_path) #marks the entry as recently used
+            return body
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        website = request_page(path, session, timeout, limiter, headers=headers)
+        if website.status_code == 304:
+            self._count('revalidated')
+            meta['fetched'] = time.time()
+            self._write_meta(meta_path, meta)
+            return body
+
+        self._count('misses')
+        self._store(path, website)
+        return website.text
+
+    def get(self, path: str):
+        """Return the stored body of a page without touching the network, however old it is
+
+        Args:
+            path (str): url of the page
 
-    soup = BeautifulSoup(contents)
+        Return: str: the body of the page, None if it is not cached
+        """
+        meta, body = self._read(path)
+        if meta is not None:
+            self._count('hits')
+        return body
+
+    def stats(self):
+        """Counters of the cache
+
+        Return: dict(str,int): hits, revalidated, misses and bytes stored
+        """
+        with self.lock:
+            return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses, 'bytes': self.total_bytes}
+
+def soup_visible_text(contents: str):
+    """Visible lines of a page using a full BeautifulSoup tree
+
+    Args:
+        contents (str): html of the page
+
+    Return: list[str]: the visible lines of the page, lowercased
+    """
+    soup = BeautifulSoup(contents, 'html.parser') #pinned, the lines depend on the parser and the streaming path uses html.parser too
     [s.extract() for s in soup(['[document]', 'title'])]
     visible_text = soup.getText().replace('\r', '\n').replace('\t', '').lower().split('\n')
 
@@ -32,6 +277,113 @@ def scrape_website(path: str):
 
     return visible_text
 
+#tags whose text is never visible, BeautifulSoup's getText skips these too (title is extracted in soup_visible_text)
+hidden_tags = ('script', 'style', 'template', 'title')
+
+class _VisibleTextParser(html.parser.HTMLParser):
+    """Event based parser collecting the visible lines of a page without building a tree"""
+    def __init__(self, skip_tags):
+        super().__init__(convert_charrefs=True)
+        self.skip_tags = set(skip_tags)
+        self.skip_depth = 0
+        self.partial = []
+        self.lines = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skip_tags:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.skip_tags and self.skip_depth > 0:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        #text runs on across inline tags, a line only ends at a newline
+        pieces = data.replace('\r', '\n').replace('\t', '').split('\n')
+        self.partial.append(pieces[0])
+        for piece in pieces[1:]:
+            self.end_line()
+            self.partial.append(piece)
+
+    def end_line(self):
+        line = ''.join(self.partial).strip()
+        self.partial = []
+        if line:
+            self.lines.append(line.lower())
+
+def iter_visible_text(contents: str, skip_tags = hidden_tags + ('nav',), chunk_size: int = 64*1024):
+    """Yield the visible lines of a page with a streaming parser
+
+    Gives the same lines as soup_visible_text when skip_tags is hidden_tags, by
+    default navigation menus are skipped as well.
+
+    Args:
+        contents (str): html of the page
+        skip_tags (tuple[str], optional): tags whose text is dropped. Defaults to hidden_tags and nav.
+        chunk_size (int, optional): characters fed to the parser at a time. Defaults to 65536.
+
+    Return: generator of str: the visible lines of the page, lowercased
+    """
+    parser = _VisibleTextParser(skip_tags)
+    for start in range(0, len(contents), chunk_size):
+        parser.feed(contents[start:start + chunk_size])
+        yield from parser.lines
+        parser.lines = []
+    parser.close()
+    parser.end_line()
+    yield from parser.lines
+
+def compare_text_extraction(corpus_dir: str, skip_tags = hidden_tags):
+    """Check iter_visible_text against soup_visible_text on a folder of saved pages
+
+    Args:
+        corpus_dir (str): folder of saved .html pages
+        skip_tags (tuple[str], optional): tags skipped by iter_visible_text. Defaults to hidden_tags.
+
+    Return: pd.DataFrame: per page, whether the lines match and the time each extractor took
+    """
+    rows = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.endswith(('.html', '.htm')):
+            continue
+        with open(os.path.join(corpus_dir, name), 'r', encoding='utf-8', errors='replace') as fo:
+            contents = fo.read()
+        start = time.perf_counter()
+        expected = soup_visible_text(contents)
+        soup_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        lines = list(iter_visible_text(contents, skip_tags))
+        fast_seconds = time.perf_counter() - start
+        rows.append({'page': name, 'match': lines == expected, 'soup_seconds': soup_seconds, 'fast_seconds': fast_seconds})
+    return pd.DataFrame(rows)
+
+@timed('scrape_website', rows=len)
+def scrape_website(path: str, session: requests.Session = None, timeout: float = 10, limiter: HostRateLimiter = None, cache: ResponseCache = None, fast: bool = False):
+    """Return the string of the data from a website given a path
+
+    Args:
+        path (str): url of the page
+        session (requests.Session, optional): session to reuse connections from. Defaults to a one-off request.
+        timeout (float, optional): seconds to wait for the server. Defaults to 10.
+        limiter (HostRateLimiter, optional): per-host rate limit. Defaults to None.
+        cache (ResponseCache, optional): on-disk cache to serve and store the page. Defaults to None.
+        fast (bool, optional): use the streaming iter_visible_text instead of BeautifulSoup, also drops nav text. Defaults to False.
+    
+    Return: list[str]: the visible lines of the page, lowercased
+
+    """
+    #website = urllib.request.urlopen(path)
+    if cache is not None:
+        contents = cache.fetch(path, session, timeout, limiter)
+    else:
+        contents = fetch_page(path, session, timeout, limiter)
+
+    if fast:
+        return list(iter_visible_text(contents))
+    return soup_visible_text(contents)
+
 #evaluation features: url length(number of slashes), "asian" count, "southeast asian" count, "pacific islander" count, counts for every single country
 # zipcode (or fips code), "aapi" count, 
 # have to estimate recruiting area, then estimate demographics in recruiting area
@@ -62,114 +414,466 @@ def generic_phrase_counter(txt: List[str], word: str):
     """
     return sum([len(re.findall(r'\b%s\b' % word, phrase)) for phrase in txt])
 
-def extract_all_features(url: str):
+#search phrase for every count feature, add a country here and it is counted in the same single pass
+phrase_features = {
+    'count_asian': 'asian',
+    'count_southeast_asian': 'southeast asian',
+    'count_pacific_islander': 'pacific islander',
+    'count_east_asian': 'east asian',
+    'count_south_asian': 'south asian',
+    'count_china': 'china',
+    'count_india': 'india',
+    'count_indonesia': 'indonesia',
+    'count_pakistan': 'pakistan',
+    'count_bangladesh': 'bangladesh',
+    'count_japan': 'japan',
+    'count_philippines': 'philippines',
+    'count_vietnam': 'vietnam',
+    'count_turkey': 'turkey',
+    'count_iran': 'iran',
+    'count_thailand': 'thailand',
+    'count_myanmar': 'myanmar',
+    'count_south_korea': 'south korea',
+    'count_iraq': 'iraq',
+    'count_afghanistan': 'afghanistan',
+    'count_saudi_arabia': 'saudi arabia',
+    'count_uzbekistan': 'uzbekistan',
+    'count_malaysia': 'malaysia',
+    'count_yemen': 'yemen',
+    'count_nepal': 'nepal',
+    'count_north_korea': 'north korea',
+    'count_sri_lanka': 'sri lanka',
+    'count_kazakhstan': 'kazakhstan',
+    'count_syria': 'syria',
+    'count_cambodia': 'cambodia',
+    'count_jordan': 'jordan',
+    'count_azerbaijan': 'azerbaijan',
+    'count_uae': 'united arab emirates',
+    'count_tajikistan': 'tajikistan',
+    'count_israel': 'israel',
+    'count_laos': 'laos',
+    'count_lebanon': 'lebanon',
+    'count_kyrgyzstan': 'kyrgyzstan',
+    'count_turkmenistan': 'turkmenistan',
+    'count_singapore': 'singapore',
+    'count_oman': 'oman',
+    'count_palestine': 'palestine', #not sure if state of palestine
+    'count_kuwait': 'kuwait',
+    'count_georgia': 'georgia',
+    'count_mongolia': 'mongolia',
+    'count_armenia': 'armenia',
+    'count_qatar': 'qatar',
+    'count_bahrain': 'bahrain',
+    'count_timor_leste': 'timor-leste',
+    'count_cyprus': 'cyprus',
+    'count_bhutan': 'bhutan',
+    'count_maldives': 'maldives',
+    'count_brunei': 'brunei',
+    'count_taiwan': 'taiwan',
+    'count_hong_kong': 'hong kong',
+    'count_macao': 'macao'
+}
+
+class PhraseCounter:
+    """Count many phrases in one scan of the text
+
+    All phrases are compiled into one alternation inside a lookahead, so every
+    word boundary is tested once against the whole term list and overlapping
+    phrases (asian inside southeast asian) are still counted like
+    generic_phrase_counter does.
+    """
+    def __init__(self, features: dict = phrase_features):
+        self.features = dict(features)
+        self.phrases = sorted(set(self.features.values()), key=len, reverse=True)
+        alternation = '|'.join(re.escape(phrase) for phrase in self.phrases)
+        self.pattern = re.compile(r'\b(?=(%s)\b)' % alternation)
+        #shorter phrases that start at the same place as a longer match, the lookahead only reports the longest
+        self.nested = {
+            phrase: [other for other in self.phrases if other != phrase and re.match(r'%s\b' % re.escape(other), phrase)]
+            for phrase in self.phrases
+        }
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """Build a counter from a csv with feature and phrase columns
+
+        Args:
+            path (str): location of the csv
+
+        Return: PhraseCounter
+        """
+        terms = pd.read_csv(path)
+        return cls(dict(zip(terms['feature'], terms['phrase'])))
+
+    def count(self, txt: List[str]):
+        """Count every phrase in a list of strings
+
+        Args:
+            txt (list[str]): a list of strings as output from scraping
+
+        Return: dict(str,int): the count of every feature
+        """
+        counts = Counter(match.group(1) for match in self.pattern.finditer('\n'.join(txt)))
+        for phrase, count in list(counts.items()):
+            for other in self.nested[phrase]:
+                counts[other] += count
+        return {feature: counts[phrase] for feature, phrase in self.features.items()}
+
+default_phrase_counter = PhraseCounter()
+
+#scraped text is lowercased, so are these
+us_states = {
+    'al': 'alabama', 'ak': 'alaska', 'az': 'arizona', 'ar': 'arkansas', 'ca': 'california',
+    'co': 'colorado', 'ct': 'connecticut', 'de': 'delaware', 'dc': 'district of columbia', 'fl': 'florida',
+    'ga': 'georgia', 'hi': 'hawaii', 'id': 'idaho', 'il': 'illinois', 'in': 'indiana',
+    'ia': 'iowa', 'ks': 'kansas', 'ky': 'kentucky', 'la': 'louisiana', 'me': 'maine',
+    'md': 'maryland', 'ma': 'massachusetts', 'mi': 'michigan', 'mn': 'minnesota', 'ms': 'mississippi',
+    'mo': 'missouri', 'mt': 'montana', 'ne': 'nebraska', 'nv': 'nevada', 'nh': 'new hampshire',
+    'nj': 'new jersey', 'nm': 'new mexico', 'ny': 'new york', 'nc': 'north carolina', 'nd': 'north dakota',
+    'oh': 'ohio', 'ok': 'oklahoma', 'or': 'oregon', 'pa': 'pennsylvania', 'ri': 'rhode island',
+    'sc': 'south carolina', 'sd': 'south dakota', 'tn': 'tennessee', 'tx': 'texas', 'ut': 'utah',
+    'vt': 'vermont', 'va': 'virginia', 'wa': 'washington', 'wv': 'west virginia', 'wi': 'wisconsin',
+    'wy': 'wyoming', 'pr': 'puerto rico'
+}
+
+def load_valid_zips(zip_path: str):
+    """Load the set of real zip codes from the zip/ZCTA crosswalk
+
+    Args:
+        zip_path (str): location of the crosswalk csv
+
+    Return: frozenset[str]: five digit zip codes
+    """
+    zips = pd.read_csv(zip_path, usecols=['ZIP_CODE'], dtype={'ZIP_CODE': str})['ZIP_CODE']
+    return frozenset(zips.str.zfill(5))
+
+#two letter states that are also common words once lowercased ('in', 'or', 'me'...)
+#in an address they only count after a comma, as in 'columbus, oh 43210'
+ambiguous_state_codes = frozenset(['al', 'co', 'de', 'hi', 'id', 'in', 'la', 'ma', 'me', 'mo', 'ne', 'oh', 'ok', 'or'])
+
+class ZipExtractor:
+    """Find the first credible zip code in scraped lines
+
+    A zip right after a state, as in an address (pittsburgh, pa 15282-0001), is
+    preferred over any other five digit number. State codes that are also words
+    (in, or, me...) need a comma before them to count as a state. Candidates not in valid_zips are
+    ignored, and digits glued to other digits or hyphens (phone numbers, dates)
+    never match. The patterns are compiled once.
+    """
+    def __init__(self, valid_zips: frozenset = None):
+        self.valid_zips = valid_zips
+        states = '|'.join(sorted([code for code in us_states if code not in ambiguous_state_codes] + list(us_states.values()), key=len, reverse=True))
+        ambiguous = '|'.join(sorted(ambiguous_state_codes))
+        zip_code = r'(\d{5})(?:-\d{4})?(?![\d-])'
+        self.address_pattern = re.compile(r'(?:\b(?:%s)|,[^\S\n]*(?:%s)\b)\.?,?[^\S\n]+%s' % (states, ambiguous, zip_code))
+        self.zip_pattern = re.compile(r'(?<![\d-])%s' % zip_code)
+
+    def credible(self, zip_code: str):
+        return self.valid_zips is None or zip_code in self.valid_zips
+
+    def extract(self, txt: List[str]):
+        """The zip code of a page
+
+        Args:
+            txt (list[str]): a list of strings as output from scraping
+
+        Return: str: five digit zip code, None if there is no credible one
+        """
+        fallback = None
+        for text_element in txt:
+            for search in self.address_pattern.finditer(text_element):
+                if self.credible(search.group(1)):
+                    return search.group(1)
+            if fallback is None:
+                for search in self.zip_pattern.finditer(text_element):
+                    if self.credible(search.group(1)):
+                        fallback = search.group(1)
+                        break
+        return fallback
+
+    def extract_series(self, texts: pd.Series):
+        """The zip code of many pages at once, same result as extract on each page
+
+        Args:
+            texts (pd.Series): the lines of each page joined by newlines
+
+        Return: pd.Series: five digit zip code of each page, NaN if there is no credible one
+        """
+        def first_credible(pattern):
+            candidates = texts.str.extractall(pattern)[0]
+            if self.valid_zips is not None:
+                candidates = candidates.loc[candidates.isin(self.valid_zips)]
+            return candidates.groupby(level=0).first().reindex(texts.index)
+        return first_credible(self.address_pattern).combine_first(first_credible(self.zip_pattern))
+
+default_zip_extractor = ZipExtractor()
+
+@timed('extract_all_features')
+def extract_all_features(url: str, counter: PhraseCounter = None, zip_extractor: ZipExtractor = None, **fetch_args):
     """extract all features from a website regarding treatment of AAPI subgroups in diversity statements
 
     Args:
         url (str): url to query
+        counter (PhraseCounter, optional): the phrases to count. Defaults to phrase_features.
+        zip_extractor (ZipExtractor, optional): finds the zip code. Defaults to one without a list of valid zips.
+        **fetch_args: session, timeout, limiter, cache and fast passed on to scrape_website
 
     Return: dict(str,float):features as strings with counts as ints
     """
-    full_scraped = scrape_website(url)
+    counter = default_phrase_counter if counter is None else counter
+    full_scraped = scrape_website(url, **fetch_args)
     scraped = [txt for txt in full_scraped if len(txt) > 40]
-    out = {
-        'url_length': feature_url_length(url),
-        'count_asian': generic_phrase_counter(scraped, "asian"),
-        'count_southeast_asian': generic_phrase_counter(scraped, "southeast asian"),
-        'count_pacific_islander': generic_phrase_counter(scraped, "pacific islander"),
-        'count_east_asian': generic_phrase_counter(scraped, "east asian"),
-        'count_south_asian': generic_phrase_counter(scraped, "south asian"),
-        'count_china': generic_phrase_counter(scraped, "china"),
-        'count_india': generic_phrase_counter(scraped, "india"),
-        'count_indonesia': generic_phrase_counter(scraped, "indonesia"),
-        'count_pakistan': generic_phrase_counter(scraped, "pakistan"),
-        'count_bangladesh': generic_phrase_counter(scraped, "bangladesh"),
-        'count_japan': generic_phrase_counter(scraped, "japan"),
-        'count_philippines': generic_phrase_counter(scraped, "philippines"),
-        'count_vietnam': generic_phrase_counter(scraped, "vietnam"),
-        'count_turkey': generic_phrase_counter(scraped, "turkey"),
-        'count_iran': generic_phrase_counter(scraped, "iran"),
-        'count_thailand': generic_phrase_counter(scraped, "thailand"),
-        'count_myanmar': generic_phrase_counter(scraped, "myanmar"),
-        'count_south_korea': generic_phrase_counter(scraped, "south korea"),
-        'count_iraq': generic_phrase_counter(scraped, "iraq"),
-        'count_afghanistan': generic_phrase_counter(scraped, "afghanistan"),
-        'count_saudi_arabia': generic_phrase_counter(scraped, "saudi arabia"),
-        'count_uzbekistan': generic_phrase_counter(scraped, "uzbekistan"),
-        'count_malaysia': generic_phrase_counter(scraped, "malaysia"),
-        'count_yemen': generic_phrase_counter(scraped, "yemen"),
-        'count_nepal': generic_phrase_counter(scraped, "nepal"),
-        'count_north_korea': generic_phrase_counter(scraped, "north korea"),
-        'count_sri_lanka': generic_phrase_counter(scraped, "sri lanka"),
-        'count_kazakhstan': generic_phrase_counter(scraped, "kazakhstan"),
-        'count_syria': generic_phrase_counter(scraped, "syria"),
-        'count_cambodia': generic_phrase_counter(scraped, "cambodia"),
-        'count_jordan': generic_phrase_counter(scraped, "jordan"),
-        'count_azerbaijan': generic_phrase_counter(scraped, "azerbaijan"),
-        'count_uae': generic_phrase_counter(scraped, "united arab emirates"),
-        'count_tajikistan': generic_phrase_counter(scraped, "tajikistan"),
-        'count_israel': generic_phrase_counter(scraped, "israel"),
-        'count_laos': generic_phrase_counter(scraped, "laos"),
-        'count_lebanon': generic_phrase_counter(scraped, "lebanon"),
-        'count_kyrgyzstan': generic_phrase_counter(scraped, "kyrgyzstan"),
-        'count_turkmenistan': generic_phrase_counter(scraped, "turkmenistan"),
-        'count_singapore': generic_phrase_counter(scraped, "singapore"),
-        'count_kyrgyzstan': generic_phrase_counter(scraped, "kyrgyzstan"),
-        'count_oman': generic_phrase_counter(scraped, "oman"),
-        'count_palestine': generic_phrase_counter(scraped, "palestine"), #not sure if state of palestine
-        'count_kuwait': generic_phrase_counter(scraped, "kuwait"),
-        'count_georgia': generic_phrase_counter(scraped, "georgia"),
-        'count_mongolia': generic_phrase_counter(scraped, "mongolia"),
-        'count_armenia': generic_phrase_counter(scraped, "armenia"),
-        'count_qatar': generic_phrase_counter(scraped, "qatar"),
-        'count_bahrain': generic_phrase_counter(scraped, "bahrain"),
-        'count_timor_leste': generic_phrase_counter(scraped, "timor-leste"),
-        'count_cyprus': generic_phrase_counter(scraped, "cyprus"),
-        'count_bhutan': generic_phrase_counter(scraped, "bhutan"),
-        'count_maldives': generic_phrase_counter(scraped, "maldives"),
-        'count_brunei': generic_phrase_counter(scraped, "brunei"),
-        'count_taiwan': generic_phrase_counter(scraped, "taiwan"),
-        'count_hong_kong': generic_phrase_counter(scraped, "hong kong"),
-        'count_macao': generic_phrase_counter(scraped, "macao"),
-        'zip': get_zipcode(full_scraped),
-        'url': url
-    }
+    out = {'url_length': feature_url_length(url)}
+    out.update(counter.count(scraped))
+    out['zip'] = get_zipcode(full_scraped, zip_extractor)
+    out['url'] = url
+    return out
+
+def get_zipcode(txt: List[str], extractor: ZipExtractor = None):
+    """Find the zip code of a page, see ZipExtractor
+
+    Args:
+        txt (list[str]): a list of strings as output from scraping
+        extractor (ZipExtractor, optional): extractor to use. Defaults to one without a list of valid zips.
+
+    Return: str: five digit zip code, None if there is no credible one
+    """
+    extractor = default_zip_extractor if extractor is None else extractor
+    return extractor.extract(txt)
+
+@timed('extract_corpus_features', rows=len)
+def extract_corpus_features(pages: dict, counter: PhraseCounter = None, zip_extractor: ZipExtractor = None):
+    """extract the features of many pages at once into a sparse document by term table
+
+    All pages are joined into one text and scanned once by the counter's pattern,
+    the matches are turned into a sparse count matrix without any per-page loop.
+    Gives the same values as extract_all_features for each page.
+
+    Args:
+        pages (dict(str,list[str])): visible lines of each page keyed by url, as from scrape_website
+        counter (PhraseCounter, optional): the phrases to count. Defaults to phrase_features.
+        zip_extractor (ZipExtractor, optional): finds the zip codes. Defaults to one without a list of valid zips.
+
+    Return: pd.DataFrame: one row per url with url_length, sparse count_* columns, zip and url
+    """
+    counter = default_phrase_counter if counter is None else counter
+    zip_extractor = default_zip_extractor if zip_extractor is None else zip_extractor
+    urls = pd.Series(list(pages.keys()), dtype=object)
+    full_text = pd.Series(['\n'.join(lines) for lines in pages.values()], dtype=object)
+    long_text = ['\n'.join(txt for txt in lines if len(txt) > 40) for lines in pages.values()]
+
+    #one scan over the whole corpus, a newline between pages keeps phrases from spanning two pages
+    starts = np.cumsum([0] + [len(text) + 1 for text in long_text[:-1]])
+    phrase_ids = {phrase: column for column, phrase in enumerate(counter.phrases)}
+    matches = [(match.start(), phrase_ids[match.group(1)]) for match in counter.pattern.finditer('\n'.join(long_text))]
+    positions, phrase_columns = (np.array(values, dtype=np.int64) for values in zip(*matches)) if matches else (np.zeros(0, dtype=np.int64),)*2
+    documents = np.searchsorted(starts, positions, side='right') - 1
+    counts = scipy.sparse.coo_matrix((np.ones(len(positions), dtype=np.int64), (documents, phrase_columns)), shape=(len(pages), len(counter.phrases))).tocsr()
+
+    #a match of a longer phrase also counts the shorter phrases starting at the same place
+    nested = scipy.sparse.identity(len(counter.phrases), dtype=np.int64, format='lil')
+    for phrase, others in counter.nested.items():
+        for other in others:
+            nested[phrase_ids[phrase], phrase_ids[other]] = 1
+    counts = counts @ nested.tocsr()
+    counts = counts[:, [phrase_ids[phrase] for phrase in counter.features.values()]]
+
+    out = pd.DataFrame.sparse.from_spmatrix(counts, columns=list(counter.features))
+    out.insert(0, 'url_length', urls.str.replace('https://', '', regex=False).str.replace('http://', '', regex=False).str.count('/').to_numpy())
+    out['zip'] = zip_extractor.extract_series(full_text).to_numpy()
+    out['url'] = urls.to_numpy()
     return out
 
-def get_zipcode(txt: List[str]):
-    zip_codes = []
-    search_string = r'\D\d{5}\D' #we want a list of 5 digits
-    #want re.search (re.match will find if there's a match)
-    for text_element in txt:
-        search = re.search(search_string, ' ' + text_element + ' ')
-        if search is not None:
-            zip_codes.append(search.group(0))
-    return zip_codes[0][1:-1] if len(zip_codes) > 0 else None
+def corpus_from_cache(cache: ResponseCache, urls: List[str], fast: bool = True):
+    """Visible lines of cached pages, for recomputing features without downloading anything
 
-def loop_through_universities(path:str):
-    """_summary_
+    Args:
+        cache (ResponseCache): cache the pages were stored in while scraping
+        urls (list[str]): urls of the pages, pages missing from the cache are skipped
+        fast (bool, optional): extract text with iter_visible_text, see scrape_website. Defaults to True.
+
+    Return: dict(str,list[str]): visible lines of each page keyed by url
+    """
+    pages = {}
+    for url in urls:
+        contents = cache.get(url)
+        if contents is not None:
+            pages[url] = list(iter_visible_text(contents)) if fast else soup_visible_text(contents)
+    return pages
+
+def scrape_university(university: str, search_function=search, search_limiter: HostRateLimiter = None, **fetch_args):
+    """Search for a university's diversity pages and extract the features of the top results
 
     Args:
-        path (str): _description_
+        university (str): name of the university
+        search_function (callable, optional): search returning result urls. Defaults to googlesearch.search.
+        search_limiter (HostRateLimiter, optional): rate limit on the search engine. Defaults to None.
+        **fetch_args: zip_extractor passed on to extract_all_features, session, timeout, limiter, cache and fast to scrape_website
+
+    Return: list[dict]: features of each search result
     """
     default_query = ' diversity and inclusion'
+    query = university.lower() + default_query
+    if search_limiter is not None:
+        search_limiter.wait('search')
+    results = list(search_function(query, num=5, stop=5, pause=0))
+    feature_list = []
+    for i, result in enumerate(results): #enumerate gives us additonal variable that is the index
+        feautures = extract_all_features(result, **fetch_args)
+        feautures['search_index'] = i
+        feautures['university'] = university
+        feautures['query'] = query
+        feature_list.append(feautures)
+    return feature_list
+
+def _open_checkpoint(path: str):
+    """Open a checkpoint for appending and find the universities already in it
+
+    A line cut off by a crash is dropped, so it is scraped again.
+
+    Args:
+        path (str): json lines checkpoint, one university per line
+
+    Return: file, set[str]: the checkpoint opened for appending and the finished universities
+    """
+    finished = set()
+    if os.path.exists(path):
+        with open(path, 'rb+') as fo:
+            good_bytes = 0
+            for line in fo:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    finished.add(json.loads(line)['university'])
+                except (ValueError, KeyError):
+                    break
+                good_bytes += len(line)
+            fo.truncate(good_bytes)
+    return open(path, 'a'), finished
+
+def read_checkpoint(path: str):
+    """Read a checkpoint written by loop_through_universities into one row per search result
+
+    Args:
+        path (str): json lines checkpoint, one university per line
+
+    Return: pd.DataFrame: features of every search result of every university
+    """
+    def rows():
+        with open(path, 'r') as fo:
+            for line in fo:
+                yield from json.loads(line)['results']
+    return pd.DataFrame(rows())
+
+def iter_checkpoint(path: str, batch_size: int = 1000):
+    """Read a checkpoint written by loop_through_universities a few universities at a time
+
+    Only one batch is held in memory, e.g. for DemographicIndex.merge_batch.
+
+    Args:
+        path (str): json lines checkpoint, one university per line
+        batch_size (int, optional): universities per batch. Defaults to 1000.
+
+    Yields:
+        pd.DataFrame: features of every search result of the batch's universities
+    """
+    with open(path, 'r') as fo:
+        batch = []
+        for n, line in enumerate(fo, 1):
+            batch.extend(json.loads(line)['results'])
+            if n % batch_size == 0:
+                yield pd.DataFrame(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch)
+
+@timed('loop_through_universities', rows=lambda result: len(result) if isinstance(result, pd.DataFrame) else None)
+def loop_through_universities(path:str, out_path: str = None, workers: int = 8, pause: float = 2, host_interval: float = 1, timeout: float = 10, search_function=search, cache: ResponseCache = None, retry_log: str = None, fast: bool = False, zip_extractor: ZipExtractor = None):
+    """Scrape the features of every university in a csv concurrently
+
+    Universities are handled by a bounded thread pool sharing one connection-pooled
+    session. Searches are spaced pause seconds apart and each host host_interval
+    seconds apart, so concurrency does not hammer any single server.
+
+    With out_path every university is appended to a json lines checkpoint as soon
+    as it finishes and nothing is kept in memory, so a restart skips the universities
+    already in the checkpoint and only loses the ones that were in flight. Failures
+    go to the retry log and are scraped again on the next run. The checkpoint is
+    not loaded at the end, read it with read_checkpoint or iter_checkpoint.
+
+    Args:
+        path (str): csv with a University column
+        out_path (str, optional): json lines checkpoint, one university with its results per line. Defaults to None.
+        workers (int, optional): universities scraped at the same time. Defaults to 8.
+        pause (float, optional): seconds between searches. Defaults to 2.
+        host_interval (float, optional): seconds between requests to the same host. Defaults to 1.
+        timeout (float, optional): seconds to wait for a server. Defaults to 10.
+        search_function (callable, optional): search returning result urls, swap for a stub to run offline. Defaults to googlesearch.search.
+        cache (ResponseCache, optional): on-disk cache of the result pages, reruns only revalidate them. Defaults to None.
+        retry_log (str, optional): json lines file of failed universities and their errors. Defaults to out_path with a .failed extension.
+        fast (bool, optional): extract text with the streaming parser, see scrape_website. Defaults to False.
+        zip_extractor (ZipExtractor, optional): finds the zip codes, ZipExtractor(load_valid_zips(zip_path)) checks them
+            against the crosswalk. Defaults to one without a list of valid zips.
+
+    Return: pd.DataFrame or str: features of every search result of every university, the path of the checkpoint with out_path
+    """
     universities = pd.read_csv(path)
+    session = make_session(pool_size=workers)
+    fetch_args = {
+        'session': session,
+        'timeout': timeout,
+        'limiter': HostRateLimiter(host_interval),
+        'cache': cache,
+        'fast': fast,
+        'zip_extractor': zip_extractor,
+        'search_limiter': HostRateLimiter(pause),
+        'search_function': search_function
+    }
 
     feature_list = []
-
-    for university in universities['University']:
-        try:
-            query = university.lower() + default_query
-            results = search(query, num=5, stop=5, pause=2)
-            for i, result in enumerate(results): #enumerate gives us additonal variable that is the index
-                feautures = extract_all_features(result)
-                feautures['search_index'] = i
-                feautures['university'] = university
-                feautures['query'] = query 
-                feature_list.append(feautures)
-            print(university)    
-        except:
-            pass
+    finished = set()
+    out_file = retry_file = None
+    if out_path is not None:
+        out_file, finished = _open_checkpoint(out_path)
+        retry_log = os.path.splitext(out_path)[0] + '.failed' if retry_log is None else retry_log
+    if retry_log is not None:
+        retry_file = open(retry_log, 'a')
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            university_iter = (university for university in universities['University'] if university not in finished)
+            while True:
+                #keep only a bounded number of universities in flight
+                for university in university_iter:
+                    pending[executor.submit(scrape_university, university, **fetch_args)] = university
+                    if len(pending) >= 2*workers:
+                        break
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    university = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as err:
+                        print('%s failed: %s' % (university, err))
+                        if retry_file is not None:
+                            retry_file.write(json.dumps({'university': university, 'error': '%s: %s' % (type(err).__name__, err), 'time': time.time()}) + '\n')
+                            retry_file.flush()
+                        continue
+                    if out_file is not None:
+                        out_file.write(json.dumps({'university': university, 'results': results}) + '\n')
+                        out_file.flush()
+                    else:
+                        feature_list.extend(results)
+                    print(university)
+    finally:
+        session.close()
+        for fo in (out_file, retry_file):
+            if fo is not None:
+                fo.close()
+    if out_path is not None:
+        return out_path
     return pd.DataFrame(feature_list)
 
 #How buried are the diversity statements
@@ -202,16 +906,18 @@ zip_col_names = {
     'ZCTA': 'zcta'
 }
 
-def demographic_by_zip(zip_path: str, demo_path: str):
-    """Load in zip code and demographic area data for merging
+def build_demographics(zip_path: str, demo_path: str):
+    """Aggregate the census demographics to municipalities and attach them to every zip code
 
     Args:
-        zip_path (str): _description_
-        demo_path (str): _description_
+        zip_path (str): location of the zip/ZCTA crosswalk csv
+        demo_path (str): location of the census demographics csv
+
+    Return: pd.DataFrame: zcta, zip, pop_total and the percent_* columns of the zip's municipality
     """
-    zip_df = pd.read_csv(zip_path)
+    zip_df = pd.read_csv(zip_path, usecols=list(zip_col_names))
     zip_df = zip_df[[column for column in zip_col_names]].rename(columns=zip_col_names)
-    demo_df = pd.read_csv(demo_path, skiprows=range(1,2))
+    demo_df = pd.read_csv(demo_path, skiprows=range(1,2), usecols=list(demo_col_names))
     demo_df = demo_df[[column for column in demo_col_names]].rename(columns=demo_col_names)
     demo_df['zcta'] = demo_df['zcta'].str[5:].astype(int) #keeps zcta code without 'zcta5'
     
@@ -223,53 +929,116 @@ def demographic_by_zip(zip_path: str, demo_path: str):
 
     comb = zip_df.merge(demo_df, on='zcta', how='left')
 
+    #agg to municipality level, one row per municipality instead of a full width transform
 
-    #agg to municipality level
+    percent_cols = [column for column in demo_col_names.values() if column[:3] == 'per']
 
-    working_cols = ['pop_total', 'municipality', 'state'] + [column for column in demo_col_names.values() if column[:3] == 'per']
-
-    for column in demo_col_names.values():
-        if column[:3] == 'per':
-            comb[column] = comb[column]*comb['pop_total']/100
+    people = comb[['municipality', 'state', 'pop_total']].copy()
+    for column in percent_cols:
+        people[column] = comb[column]*comb['pop_total']/100
     
-    aggregated = comb[working_cols].groupby(['municipality', 'state']).transform('sum')
+    aggregated = people.groupby(['municipality', 'state']).agg('sum')
     
-    for column in aggregated:
-        if column[:3] == 'per':
-            aggregated[column] = aggregated[column]/aggregated['pop_total']*100 #I think this was the error?
+    for column in percent_cols:
+        aggregated[column] = aggregated[column]/aggregated['pop_total']*100
     
+    comb = comb[['zcta', 'zip', 'municipality', 'state']].join(aggregated, on=['municipality', 'state'])
+    comb = comb.drop(columns=['municipality', 'state'])
+    return comb.astype({'zcta': 'int32', 'zip': 'int32'})
+
+@timed('demographic_by_zip', rows=len)
+def demographic_by_zip(zip_path: str, demo_path: str, cache_path: str = None):
+    """Load in zip code and demographic area data for merging
+
+    The aggregated table only changes with the census inputs, so it is built once
+    and stored as an uncompressed feather file next to the crosswalk. Later calls
+    memory map that file until either input's mtime or size changes, or the file
+    cannot be read.
+
+    Args:
+        zip_path (str): location of the zip/ZCTA crosswalk csv
+        demo_path (str): location of the census demographics csv
+        cache_path (str, optional): location of the feather cache. Defaults to demographics_by_zip.feather next to zip_path.
 
-    comb = comb[['zcta', 'zip']].join(aggregated) #double brackets will produce a data frame and not a series
-    # join() vs. merge(): merging on index not on columns
+    Return: pd.DataFrame: zcta, zip, pop_total and the percent_* columns of the zip's municipality
+    """
+    cache_path = os.path.join(os.path.dirname(zip_path), 'demographics_by_zip.feather') if cache_path is None else cache_path
+    stamp = dict(file_stamp(zip_path, 'zip'), **file_stamp(demo_path, 'demo'))
+    table = read_cache(cache_path)
+    cached = cache_stamp(table)
+    if all(cached.get(key) == value for key, value in stamp.items()):
+        return table.to_pandas()
 
+    comb = build_demographics(zip_path, demo_path)
+    write_cache(comb, cache_path, stamp)
     return comb
 
 
-def merge_dfs(demo_cross_df: pd.DataFrame, uni_df: pd.DataFrame):
+class DemographicIndex:
+    """Demographics indexed by integer zip, for joining scraped universities in batches
+
+    The first valid zip seen for each university is remembered, so later batches of
+    scrape results get the same backfilled zip without rejoining earlier batches.
+    """
+    def __init__(self, demo_cross_df: pd.DataFrame):
+        start = time.perf_counter()
+        self.table = demo_cross_df.astype({'zip': 'int32'}).set_index('zip').sort_index()
+        self.university_zips = pd.Series(dtype='Int32')
+        self.timings = {'build': time.perf_counter() - start, 'backfill': 0.0, 'join': 0.0, 'rows': 0}
+
+    def backfill_zip(self, uni_df: pd.DataFrame):
+        """First valid zip of each university, the same for every one of its rows
+
+        Args:
+            uni_df (pd.DataFrame): scraped universities with university and zip columns
+
+        Return: pd.Series: integer zip of every row, NA if its university has none yet
+        """
+        zips = pd.to_numeric(uni_df['zip'], errors='coerce').astype('Int32')
+        first = zips.groupby(uni_df['university']).first().dropna()
+        #a university already seen keeps the zip from its earlier batch
+        first = first.loc[~first.index.isin(self.university_zips.index)]
+        self.university_zips = pd.concat([self.university_zips, first])
+        return uni_df['university'].map(self.university_zips).astype('Int32')
+
+    def merge_batch(self, uni_df: pd.DataFrame):
+        """Join a batch of scraped universities with the demographics of their zip
+
+        Args:
+            uni_df (pd.DataFrame): scraped universities with university and zip columns
+
+        Return: pd.DataFrame: rows with a zip, with the demographic columns added
+        """
+        start = time.perf_counter()
+        uni_df = uni_df.assign(zip=self.backfill_zip(uni_df))
+        uni_df = uni_df.loc[uni_df['zip'].notna(), :]
+        backfilled = time.perf_counter()
+        comb2 = uni_df.join(self.table, on='zip', how='left')
+        self.timings['backfill'] += backfilled - start
+        self.timings['join'] += time.perf_counter() - backfilled
+        self.timings['rows'] += len(uni_df)
+        return comb2
+
+@timed('merge_dfs', rows=len)
+def merge_dfs(demo_cross_df: pd.DataFrame, uni_df: pd.DataFrame, timings: dict = None):
     """Merging university dataframe with demographic dataframe
 
      Args:
          demo_df (pd.DataFrame): demographic dataframe
          uni_df (pd.DataFrame): university dataframe
+         timings (dict, optional): filled with the seconds spent building the index, backfilling and joining. Defaults to None.
     """
-    def fill_nan_zip(sr):
-        if sr.notna().sum()>0:
-            return sr.loc[sr.first_valid_index()]
-        else:
-            return np.nan
-    #groupby(search query).transform
-    #goes outside
-    uni_df['zip'] = uni_df[['university', 'zip']].groupby('university').transform(fill_nan_zip)['zip'].dropna().astype(int)
-    comb2 = uni_df.merge(demo_cross_df, on='zip', how='left')
-    #comb2['zip'] = comb2['zip'].dropna(subset = ['zip'])
-    #comb2['zip'] = comb2['zip'].replace('', np.nan)
-    comb2 = comb2.dropna(subset=['zip'])
+    #groupby(search query).first, vectorized instead of a function per university
+    index = DemographicIndex(demo_cross_df)
+    comb2 = index.merge_batch(uni_df)
+    if timings is not None:
+        timings.update(index.timings)
     return comb2
 
 
 if __name__ == "__main__":
-    #df = loop_through_universities('data//good_university_list.csv')
-    #df.to_csv('data//web_scraped_uni.csv')
+    #checkpoint = loop_through_universities('data//good_university_list.csv', 'data//web_scraped_uni.jsonl', zip_extractor=ZipExtractor(load_valid_zips('data//zipzcta_crosswalk.csv')))
+    #read_checkpoint(checkpoint).to_csv('data//web_scraped_uni.csv')
     demo_cross_df = demographic_by_zip('data//zipzcta_crosswalk.csv', 'data//demo.csv')
     uni_df = pd.read_csv('data//web_scraped_uni.csv')
     comb = merge_dfs(demo_cross_df, uni_df)